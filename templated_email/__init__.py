@@ -1,15 +1,45 @@
 from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
 from django.utils.module_loading import import_string
 
 from templated_email.backends.vanilla_django import TemplateBackend
 from templated_email.utils import InlineImage  # noqa
 
 
+# Backend classes by the dotted path they were imported from.
+_backend_klasses = {}
+
+
+@receiver(setting_changed, dispatch_uid='templated_email_backend_setting_changed')
+def _clear_backend_klasses(sender, setting, **kwargs):
+    if setting == 'TEMPLATED_EMAIL_BACKEND':
+        _backend_klasses.clear()
+
+
+def _get_backend_klass(klass_path):
+    klass = _backend_klasses.get(klass_path)
+    if klass is None:
+        try:
+            # First check if class name is omitted and we have module in settings
+            klass = import_string(klass_path + '.' + 'TemplateBackend')
+        except ImportError:
+            # Fallback to class name
+            klass = import_string(klass_path)
+        _backend_klasses[klass_path] = klass
+    return klass
+
+
 def get_connection(backend=None, template_prefix=None, template_suffix=None,
                    fail_silently=False, **kwargs):
     """Load a templated e-mail backend and return an instance of it.
 
     If backend is None (default) settings.TEMPLATED_EMAIL_BACKEND is used.
+    Backend classes are imported once per dotted path.
+
+    The backend may also be a ready-made instance, which is returned as is
+    unless other arguments are given, so it can be kept in settings or by
+    the caller and reused for every message.
 
     Both fail_silently and other keyword arguments are used in the
     constructor of the backend.
@@ -19,14 +49,13 @@ def get_connection(backend=None, template_prefix=None, template_suffix=None,
     klass_path = backend or getattr(settings, 'TEMPLATED_EMAIL_BACKEND',
                                     TemplateBackend)
     if isinstance(klass_path, str):
-        try:
-            # First check if class name is omitted and we have module in settings
-            klass = import_string(klass_path + '.' + 'TemplateBackend')
-        except ImportError:
-            # Fallback to class name
-            klass = import_string(klass_path)
-    else:
+        klass = _get_backend_klass(klass_path)
+    elif callable(klass_path):
         klass = klass_path
+    elif template_prefix or template_suffix or fail_silently or kwargs:
+        klass = type(klass_path)
+    else:
+        return klass_path
 
     return klass(fail_silently=fail_silently, template_prefix=template_prefix,
                  template_suffix=template_suffix, **kwargs)
@@ -51,6 +80,24 @@ def get_templated_mail(template_name, context, from_email=None, to=None,
                                        create_link=create_link)
 
 
+async def aget_templated_mail(template_name, context, from_email=None, to=None,
+                              cc=None, bcc=None, headers=None,
+                              template_prefix=None, template_suffix=None,
+                              template_dir=None, file_extension=None,
+                              create_link=False):
+    """Async version of get_templated_mail."""
+    template_prefix = template_prefix or template_dir
+    template_suffix = template_suffix or file_extension
+    templater = TemplateBackend(template_prefix=template_prefix,
+                                template_suffix=template_suffix)
+    return await templater.aget_email_message(template_name, context,
+                                              from_email=from_email, to=to,
+                                              cc=cc, bcc=bcc, headers=headers,
+                                              template_prefix=template_prefix,
+                                              template_suffix=template_suffix,
+                                              create_link=create_link)
+
+
 def send_templated_mail(template_name, from_email, recipient_list, context,
                         cc=None, bcc=None, fail_silently=False, connection=None,
                         headers=None, template_prefix=None,
@@ -66,3 +113,82 @@ def send_templated_mail(template_name, from_email, recipient_list, context,
     return connection.send(template_name, from_email, recipient_list, context,
                            cc=cc, bcc=bcc, fail_silently=fail_silently,
                            headers=headers, create_link=create_link, **kwargs)
+
+
+def send_templated_mass_mail(template_name, from_email, recipients_with_contexts,
+                             cc=None, bcc=None, fail_silently=False,
+                             connection=None, headers=None,
+                             template_prefix=None, template_suffix=None,
+                             create_link=False, **kwargs):
+    """Send one templated email per (recipient_list, context) pair over a
+    single mail connection.
+
+    Returns a list with one SendResult per recipient.
+    See BackendClass.send_mass.__doc__
+    """
+    connection = connection or get_connection(template_prefix=template_prefix,
+                                              template_suffix=template_suffix)
+    return connection.send_mass(template_name, from_email,
+                                recipients_with_contexts,
+                                cc=cc, bcc=bcc, fail_silently=fail_silently,
+                                headers=headers, create_link=create_link,
+                                **kwargs)
+
+
+def send_templated_mass_mail_iter(template_name, from_email,
+                                  recipients_with_contexts,
+                                  cc=None, bcc=None, fail_silently=False,
+                                  connection=None, headers=None,
+                                  template_prefix=None, template_suffix=None,
+                                  create_link=False, **kwargs):
+    """Lazily send one templated email per (recipient_list, context) pair of
+    any iterable, yielding a SendResult as each message is sent.
+
+    See BackendClass.send_mass_iter.__doc__
+    """
+    connection = connection or get_connection(template_prefix=template_prefix,
+                                              template_suffix=template_suffix)
+    return connection.send_mass_iter(template_name, from_email,
+                                     recipients_with_contexts,
+                                     cc=cc, bcc=bcc,
+                                     fail_silently=fail_silently,
+                                     headers=headers, create_link=create_link,
+                                     **kwargs)
+
+
+async def asend_templated_mail(template_name, from_email, recipient_list, context,
+                               cc=None, bcc=None, fail_silently=False,
+                               connection=None, headers=None,
+                               template_prefix=None, template_suffix=None,
+                               create_link=False, **kwargs):
+    """Async version of send_templated_mail.
+
+    See BackendClass.asend.__doc__
+    """
+    connection = connection or get_connection(template_prefix=template_prefix,
+                                              template_suffix=template_suffix)
+    return await connection.asend(template_name, from_email, recipient_list,
+                                  context, cc=cc, bcc=bcc,
+                                  fail_silently=fail_silently,
+                                  headers=headers, create_link=create_link,
+                                  **kwargs)
+
+
+async def asend_templated_mass_mail(template_name, from_email,
+                                    recipients_with_contexts,
+                                    cc=None, bcc=None, fail_silently=False,
+                                    connection=None, headers=None,
+                                    template_prefix=None, template_suffix=None,
+                                    create_link=False, **kwargs):
+    """Async version of send_templated_mass_mail.
+
+    See BackendClass.asend_mass.__doc__
+    """
+    connection = connection or get_connection(template_prefix=template_prefix,
+                                              template_suffix=template_suffix)
+    return await connection.asend_mass(template_name, from_email,
+                                       recipients_with_contexts,
+                                       cc=cc, bcc=bcc,
+                                       fail_silently=fail_silently,
+                                       headers=headers,
+                                       create_link=create_link, **kwargs)
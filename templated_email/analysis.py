@@ -0,0 +1,238 @@
+"""
+Static analysis of the context variables used by the blocks of a Django
+template, following its {% extends %} and {% include %} chains.
+"""
+from django.template import Context, TemplateDoesNotExist
+from django.template.base import (
+    FilterExpression, Node, NodeList, TextNode, TokenType, Variable,
+    VariableNode)
+from django.template.defaulttags import (
+    CsrfTokenNode, DebugNode, FilterNode, ForNode, WithNode)
+from django.template.loader_tags import BlockNode, ExtendsNode, IncludeNode
+from django.template.smartif import TokenBase
+from django.templatetags.i18n import BlockTranslateNode
+
+
+# Names set by the template language itself.
+TEMPLATE_NAMES = frozenset(['block', 'forloop', 'True', 'False', 'None'])
+
+# Modules whose tags only use the variables they were given as arguments,
+# which the analysis finds in their attributes.
+KNOWN_TAG_MODULES = frozenset([
+    'django.template.base',
+    'django.template.defaulttags',
+    'django.template.library',
+    'django.template.loader_tags',
+    'django.templatetags.cache',
+    'django.templatetags.i18n',
+    'django.templatetags.l10n',
+    'django.templatetags.static',
+    'django.templatetags.tz',
+])
+
+
+class UnknownVariables(Exception):
+    """Raised when the variables used by a template can't be listed."""
+
+
+def get_template_blocks(template):
+    """
+    Return the BlockNodes of the {% extends %} chain of ``template``, a list
+    of dicts by block name from the child to the root template, along with
+    the root template. Raises UnknownVariables when the chain depends on the
+    context.
+    """
+    blocks = []
+    context = Context()
+    with context.render_context.push_state(template):
+        with context.bind_template(template):
+            while True:
+                blocks.append({node.name: node for node in
+                               template.nodelist.get_nodes_by_type(BlockNode)})
+                extends_nodes = template.nodelist.get_nodes_by_type(ExtendsNode)
+                if not extends_nodes:
+                    return blocks, template
+                parent_name = extends_nodes[0].parent_name
+                if not isinstance(parent_name.var, str) or parent_name.filters:
+                    raise UnknownVariables(
+                        "%s extends a variable" % template.origin.template_name)
+                template = extends_nodes[0].get_parent(context)
+
+
+class TemplateAnalyzer(object):
+    """
+    Lists the context variables used by the blocks of a template.
+
+    The lists may hold more names than the render actually uses, e.g. the
+    variables of block definitions that are overridden, or of branches that
+    are never taken, but never miss one: templates using tags this module
+    doesn't know about raise UnknownVariables instead.
+    """
+
+    def __init__(self, template, include_stack=()):
+        self.engine = template.engine
+        self.blocks, self.root = get_template_blocks(template)
+        self.include_stack = include_stack + (template.origin.template_name, )
+        self._block_variables = {}
+
+    def get_template_variables(self):
+        """Return the variables used by rendering the whole template."""
+        return self.nodelist(self.root.nodelist)
+
+    def get_block_variables(self, name):
+        """
+        Return the variables used by the block ``name``, or None when the
+        template has no such block.
+        """
+        if not any(name in template_blocks for template_blocks in self.blocks):
+            return None
+        return self.block(name)
+
+    def block(self, name):
+        if name not in self._block_variables:
+            # Guards against recursion until the result is known.
+            self._block_variables[name] = frozenset()
+            names = set()
+            try:
+                for template_blocks in self.blocks:
+                    if name in template_blocks:
+                        # Parent definitions may be rendered by {{ block.super }}.
+                        names |= self.nodelist(template_blocks[name].nodelist)
+            except UnknownVariables:
+                del self._block_variables[name]
+                raise
+            self._block_variables[name] = frozenset(names)
+        return self._block_variables[name]
+
+    def nodelist(self, nodelist):
+        names = set()
+        for node in nodelist:
+            names |= self.node(node)
+        return names
+
+    def node(self, node):
+        if isinstance(node, TextNode):
+            return set()
+        if isinstance(node, VariableNode):
+            return self.expression(node.filter_expression)
+        if isinstance(node, BlockNode):
+            return set(self.block(node.name))
+        if isinstance(node, ForNode):
+            return (self.expression(node.sequence)
+                    | (self.nodelist(node.nodelist_loop) - set(node.loopvars))
+                    | self.nodelist(node.nodelist_empty))
+        if isinstance(node, WithNode):
+            return (self.value(node.extra_context)
+                    | (self.nodelist(node.nodelist) - set(node.extra_context)))
+        if isinstance(node, IncludeNode):
+            return self.include(node)
+        if isinstance(node, BlockTranslateNode):
+            return self.block_translate(node)
+        if isinstance(node, FilterNode):
+            # The filtered content is the 'var' the filters are applied to.
+            return self.filters(node.filter_expr) | self.nodelist(node.nodelist)
+        if isinstance(node, CsrfTokenNode):
+            return {'csrf_token'}
+        if (isinstance(node, DebugNode)
+                or type(node).__module__ not in KNOWN_TAG_MODULES
+                or getattr(node, 'takes_context', False)):
+            raise UnknownVariables("Can't tell the variables used by %r" % node)
+        return self.value(vars(node))
+
+    def include(self, node):
+        names = self.value(node.extra_context)
+        if node.isolated_context:
+            return names
+        template_name = node.template.var
+        if not isinstance(template_name, str) or node.template.filters:
+            raise UnknownVariables("Can't tell which template is included by %r" % node)
+        if template_name in self.include_stack:
+            # A recursive include uses the variables already being listed.
+            return names
+        try:
+            template = self.engine.get_template(template_name)
+        except TemplateDoesNotExist:
+            raise UnknownVariables("%s doesn't exist" % template_name)
+        included = TemplateAnalyzer(template, self.include_stack)
+        return names | (included.get_template_variables() - set(node.extra_context))
+
+    def block_translate(self, node):
+        names = set()
+        for token in node.singular + (node.plural or []):
+            if token.token_type == TokenType.VAR:
+                names.add(token.contents)
+        names -= set(node.extra_context)
+        names.discard(node.countervar)
+        names |= self.value(node.extra_context)
+        names |= self.value(node.message_context)
+        if node.counter is not None:
+            names |= self.expression(node.counter)
+        return names
+
+    def expression(self, expression):
+        names = self.filters(expression)
+        if isinstance(expression.var, Variable):
+            names |= self.variable(expression.var)
+        return names
+
+    def filters(self, expression):
+        names = set()
+        for func, args in expression.filters:
+            for lookup, arg in args:
+                if lookup:
+                    names |= self.variable(arg)
+        return names
+
+    def variable(self, variable):
+        if variable.lookups is None or variable.lookups[0] in TEMPLATE_NAMES:
+            return set()
+        return {variable.lookups[0]}
+
+    def value(self, value):
+        """Return the variables used by an attribute of a node."""
+        if isinstance(value, FilterExpression):
+            return self.expression(value)
+        if isinstance(value, Variable):
+            return self.variable(value)
+        if isinstance(value, NodeList):
+            return self.nodelist(value)
+        if isinstance(value, Node):
+            return self.node(value)
+        if isinstance(value, TokenBase):
+            # The conditions of {% if %}, e.g. TemplateLiteral or operators.
+            return self.value([getattr(value, attr, None)
+                               for attr in ('value', 'first', 'second')])
+        if isinstance(value, dict):
+            value = value.values()
+        if isinstance(value, (list, tuple, type({}.values()))):
+            names = set()
+            for item in value:
+                names |= self.value(item)
+            return names
+        return set()
+
+
+def get_template_variables(template, parts):
+    """
+    Return a dict mapping each block of ``parts`` that ``template`` (a
+    django.template.base.Template) defines to the frozenset of the context
+    variables it uses, or None when they can't be listed.
+    """
+    try:
+        analyzer = TemplateAnalyzer(template)
+    except UnknownVariables:
+        analyzer = None
+
+    variables = {}
+    for part in parts:
+        if analyzer is None:
+            variables[part] = None
+            continue
+        try:
+            names = analyzer.get_block_variables(part)
+        except UnknownVariables:
+            variables[part] = None
+        else:
+            if names is not None:
+                variables[part] = frozenset(names)
+    return variables
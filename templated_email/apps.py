@@ -0,0 +1,31 @@
+import logging
+
+from django.apps import AppConfig
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class TemplatedEmailConfig(AppConfig):
+    name = 'templated_email'
+    verbose_name = 'Templated Email'
+    default_auto_field = 'django.db.models.AutoField'
+
+    def ready(self):
+        if getattr(settings, 'TEMPLATED_EMAIL_WARM_TEMPLATES', False):
+            self.warm_templates()
+
+    def warm_templates(self):
+        from templated_email import get_connection
+
+        backend = get_connection()
+        if not hasattr(backend, 'warm_templates'):
+            return
+        for template_name, seconds, error in backend.warm_templates():
+            if error is not None:
+                logger.warning("Couldn't warm the email template %s: %r",
+                               template_name, error)
+            else:
+                logger.debug("Warmed the email template %s in %.1f ms",
+                             template_name, seconds * 1000)
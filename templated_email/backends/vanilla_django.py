@@ -1,16 +1,43 @@
+import os
+import pickle
+import re
+import time
 import uuid
+import asyncio
 import hashlib
+import threading
+from collections import namedtuple
+from concurrent.futures import (
+    ProcessPoolExecutor, ThreadPoolExecutor, as_completed)
+from functools import partial
 from io import BytesIO
+from itertools import islice
 
 from django.conf import settings
-from django.core.mail import get_connection
-from django.template import Context
-from django.utils.translation import gettext as _
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.mail import get_connection, make_msgid
+from django.core.mail.utils import DNS_NAME
+from django.template import Context, engines, loader
+from django.template.backends.django import Template as DjangoTemplate
+from django.template.loader_tags import (
+    BLOCK_CONTEXT_KEY, BlockContext, BlockNode, ExtendsNode)
+from django.utils.translation import gettext as _, get_language
 from django.core.files.storage import default_storage
+from django.core.signals import setting_changed
+from django.db import close_old_connections
+from django.dispatch import receiver
+from django.utils.autoreload import file_changed
+from django.utils.module_loading import import_string
 
+from templated_email.analysis import get_template_variables
+from templated_email.connection_pool import RECONNECT_ERRORS, get_connection_pool
+from templated_email.signals import stage_finished, stage_started
 from templated_email.utils import (
     get_emailmessage_klass, get_emailmultialternatives_klass)
-from templated_email.utils import InlineImage
+from templated_email.utils import (
+    InlineImage, LazyValue, LRUCache, get_evaluated_value, get_message_id,
+    lazy_context, record_inline_images, resolve_inline_images)
 from render_block import render_block_to_string, BlockNotFound
 
 
@@ -24,6 +51,306 @@ class EmailRenderException(Exception):
     pass
 
 
+EMAIL_PARTS = ('subject', 'html', 'plain')
+
+
+# Outcome of sending one of the messages of a mass send: the Message-Id is
+# None whenever the message wasn't sent, in which case error holds the
+# exception raised while rendering or sending it, if any.
+SendResult = namedtuple('SendResult', ['recipient_list', 'message_id', 'error'])
+
+
+def _with_message_id(headers):
+    """
+    Return a copy of ``headers`` holding a Message-Id, generated unless one
+    is given under any case.
+    """
+    headers = dict(headers or {})
+    if get_message_id(headers) is None:
+        headers['Message-Id'] = make_msgid(domain=DNS_NAME)
+    return headers
+
+
+class CompiledEmailTemplate(object):
+    """
+    A resolved email template together with the blocks of its inheritance
+    chain, as cached by TemplateBackend.
+
+    ``blocks`` is only filled once the chain has been walked and is kept
+    as None when it can't be known in advance, i.e. when some template of
+    the chain extends a variable instead of a string literal.
+    """
+
+    def __init__(self, template, full_template_names):
+        self.template = template
+        self.full_template_names = full_template_names
+        self.blocks = None
+        self.parts = None
+        self.variables = None
+
+    def get_variables(self):
+        """
+        Return a dict mapping the parts the template defines to the context
+        variables they use, None for the parts whose variables can't be
+        listed. See templated_email.analysis.
+        """
+        if self.variables is None:
+            if isinstance(self.template, DjangoTemplate):
+                self.variables = get_template_variables(self.template.template,
+                                                        EMAIL_PARTS)
+            else:
+                self.variables = dict.fromkeys(EMAIL_PARTS)
+        return self.variables
+
+    def set_blocks(self, blocks):
+        self.blocks = blocks
+        self.parts = frozenset(part for part in EMAIL_PARTS
+                               if any(part in template_blocks
+                                      for template_blocks in blocks))
+
+
+class SubjectTemplate(object):
+    """
+    A legacy subject, i.e. a format string interpolated with the context,
+    along with the context keys it requires.
+    """
+    key_re = re.compile(r'%%|%\(([^)]*)\)')
+
+    def __init__(self, template):
+        self.template = template
+        self.keys = frozenset(key for key in self.key_re.findall(template) if key)
+
+    def render(self, context):
+        missing = [key for key in self.keys if key not in context]
+        if missing:
+            raise EmailRenderException(
+                "The subject %r requires the missing context keys: %s"
+                % (self.template, ', '.join(sorted(missing))))
+        return self.template % {
+            key: context[key]() if type(context[key]) is LazyValue else context[key]
+            for key in self.keys}
+
+
+# TEMPLATED_EMAIL_DJANGO_SUBJECTS as SubjectTemplates, and the subject of
+# each template name list for every active language.
+_subject_templates = None
+_subject_templates_by_language = {}
+
+
+def _get_subject_templates():
+    global _subject_templates
+    subject_templates = _subject_templates
+    if subject_templates is None:
+        subject_dict = getattr(settings, 'TEMPLATED_EMAIL_DJANGO_SUBJECTS', {})
+        subject_templates = {name: SubjectTemplate(subject)
+                             for name, subject in subject_dict.items()}
+        # Published once complete: other threads never see it partly filled.
+        _subject_templates = subject_templates
+    return subject_templates
+
+
+def get_subject_template(template_name):
+    """
+    Return the SubjectTemplate of ``template_name`` from the
+    TEMPLATED_EMAIL_DJANGO_SUBJECTS setting, falling back to the translation
+    of "<template_name> email subject".
+    """
+    if isinstance(template_name, (list, tuple)):
+        template_names = tuple(template_name)
+    else:
+        template_names = (template_name, )
+
+    language_subjects = _subject_templates_by_language.setdefault(get_language(), {})
+    subject_template = language_subjects.get(template_names)
+    if subject_template is None:
+        subject_templates = _get_subject_templates()
+        for template in template_names:
+            if template in subject_templates:
+                subject_template = subject_templates[template]
+                break
+        else:
+            subject_template = SubjectTemplate(_('%s email subject' % template_names[0]))
+        language_subjects[template_names] = subject_template
+    return subject_template
+
+
+@receiver(setting_changed, dispatch_uid='templated_email_subject_setting_changed')
+def _clear_subject_templates(sender, setting, **kwargs):
+    global _subject_templates
+    if setting in ('TEMPLATED_EMAIL_DJANGO_SUBJECTS', 'LANGUAGE_CODE',
+                   'LANGUAGES', 'LOCALE_PATHS'):
+        _subject_templates = None
+        _subject_templates_by_language.clear()
+
+
+PLAIN_FUNCTION_ALIASES = {
+    'html2text': 'html2text.html2text',
+    'html_parser': 'templated_email.utils.html_to_text',
+}
+
+
+def get_plain_function():
+    """
+    Return the function generating the plain part from the HTML one, from
+    TEMPLATED_EMAIL_PLAIN_FUNCTION: a callable, a dotted path or one of the
+    PLAIN_FUNCTION_ALIASES. Defaults to html2text when it's installed.
+    """
+    plain_func = getattr(settings, 'TEMPLATED_EMAIL_PLAIN_FUNCTION', None)
+    if isinstance(plain_func, str):
+        plain_func = import_string(PLAIN_FUNCTION_ALIASES.get(plain_func, plain_func))
+    if not plain_func and html2text:
+        plain_func = html2text.html2text
+    return plain_func
+
+
+_plain_cache = LRUCache(
+    partial(getattr, settings, 'TEMPLATED_EMAIL_PLAIN_CACHE_SIZE', 128))
+
+
+# The backend used by each process of a process rendering pool, so compiled
+# templates are kept between tasks.
+_worker_backend = None
+
+
+def _init_render_worker(backend_klass, backend_kwargs):
+    global _worker_backend
+    import django
+    from django.apps import apps
+    from django.db import connections
+
+    if not apps.ready:
+        # Spawned workers start from scratch and boot Django once.
+        django.setup()
+    else:
+        # Forked workers must not share the database connections of their
+        # parent, just forget them without closing.
+        for connection in connections.all(initialized_only=True):
+            connection.connection = None
+    _worker_backend = backend_klass(**backend_kwargs)
+
+
+def _render_in_worker(template_name, context, kwargs, backend=None):
+    """
+    Render a message of a mass send, returning it along with its unsaved
+    SavedEmails, so they are written by the sending side in bulk.
+    """
+    backend = backend or _worker_backend
+    saved_emails = []
+    message = backend.get_email_message(template_name, context,
+                                        saved_emails=saved_emails, **kwargs)
+    return message, saved_emails
+
+
+# Runs the blocking steps of the async API, its size bounds how many of them
+# run at the same time.
+def _run_with_fresh_connections(fn, *args, **kwargs):
+    close_old_connections()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+class _AsyncExecutor(ThreadPoolExecutor):
+    """
+    A thread pool closing the database connections of its threads which are
+    broken or older than CONN_MAX_AGE around every task, as Django does
+    around requests: the threads live as long as the process.
+    """
+
+    def submit(self, fn, /, *args, **kwargs):
+        return super(_AsyncExecutor, self).submit(
+            _run_with_fresh_connections, fn, *args, **kwargs)
+
+
+_async_executor = None
+_async_executor_lock = threading.Lock()
+
+
+def get_async_executor():
+    global _async_executor
+    with _async_executor_lock:
+        if _async_executor is None:
+            _async_executor = _AsyncExecutor(
+                getattr(settings, 'TEMPLATED_EMAIL_ASYNC_WORKERS', 10),
+                thread_name_prefix='templated_email')
+        return _async_executor
+
+
+@receiver(setting_changed, dispatch_uid='templated_email_async_setting_changed')
+def _reset_async_executor(sender, setting, **kwargs):
+    global _async_executor
+    if setting == 'TEMPLATED_EMAIL_ASYNC_WORKERS':
+        with _async_executor_lock:
+            if _async_executor is not None:
+                _async_executor.shutdown(wait=False)
+            _async_executor = None
+
+
+# URLs of the inline images saved to the default storage, by storage name.
+_hosted_image_urls = LRUCache(256)
+
+
+@receiver(setting_changed, dispatch_uid='templated_email_storage_setting_changed')
+def _clear_hosted_image_urls(sender, setting, **kwargs):
+    if setting in ('STORAGES', 'DEFAULT_FILE_STORAGE', 'MEDIA_ROOT', 'MEDIA_URL',
+                   'TEMPLATED_EMAIL_INLINE_IMAGE_CACHE_ALIAS'):
+        _hosted_image_urls.clear()
+
+
+_template_cache = LRUCache(
+    partial(getattr, settings, 'TEMPLATED_EMAIL_TEMPLATE_CACHE_SIZE', 256))
+
+
+@receiver(file_changed, dispatch_uid='templated_email_template_changed')
+def _clear_template_cache_on_file_changed(sender, file_path, **kwargs):
+    # Django resets its template loaders when a template changes while the
+    # autoreloader runs, our resolved templates must follow.
+    _template_cache.clear()
+
+
+@receiver(setting_changed, dispatch_uid='templated_email_template_setting_changed')
+def _clear_template_cache_on_setting_changed(sender, setting, **kwargs):
+    if setting in ('TEMPLATES', 'TEMPLATED_EMAIL_TEMPLATE_CACHE_SIZE'):
+        _template_cache.clear()
+
+
+def _iter_loader_templates():
+    """
+    Yield the name of every template the loaders of the configured template
+    engines can find, relative to the directories they search.
+    """
+    for engine in engines.all():
+        if hasattr(engine, 'engine'):
+            template_loaders = engine.engine.template_loaders
+            dirs = []
+            for template_loader in template_loaders:
+                if hasattr(template_loader, 'get_dirs'):
+                    dirs.extend(template_loader.get_dirs())
+                # The locmem loader has no directories, only a dict.
+                for inner_loader in getattr(template_loader, 'loaders', [template_loader]):
+                    yield from getattr(inner_loader, 'templates_dict', ())
+        else:
+            dirs = engine.template_dirs
+        for directory in dirs:
+            directory = str(directory)
+            for root, _dirs, files in os.walk(directory):
+                for filename in files:
+                    path = os.path.relpath(os.path.join(root, filename), directory)
+                    yield path.replace(os.sep, '/')
+
+
+class _RenderCacheKeyPickler(pickle.Pickler):
+    """Pickles the values keying a part, refusing InlineImages."""
+
+    def persistent_id(self, obj):
+        # The Content-ID of an image belongs to a single message, the parts
+        # rendering one can't be shared.
+        if isinstance(obj, InlineImage):
+            raise pickle.PicklingError("InlineImages can't key a rendered part")
+        return None
+
+
 class TemplateBackend(object):
     """
     Backend which uses Django's
@@ -62,27 +389,64 @@ class TemplateBackend(object):
         self.template_prefix = template_prefix or getattr(settings, 'TEMPLATED_EMAIL_TEMPLATE_DIR', 'templated_email/')
         self.template_suffix = template_suffix or getattr(settings, 'TEMPLATED_EMAIL_FILE_EXTENSION', 'email')
 
-    def attach_inline_images(self, message, context):
+    def attach_inline_images(self, message, context, inline_images=None):
+        """
+        Attach ``inline_images``, the InlineImages the rendered parts use, to
+        ``message``. Without them every InlineImage of ``context`` is
+        attached.
+        """
+        if inline_images is None:
+            inline_images = self._get_context_inline_images(context)
+        for inline_image in inline_images:
+            inline_image.attach_to_message(message)
+
+    def _get_context_inline_images(self, context):
+        inline_images = []
         for value in context.values():
+            # Lazy values no template used are left unevaluated.
+            value = get_evaluated_value(value)
             if isinstance(value, InlineImage):
-                value.attach_to_message(message)
+                inline_images.append(value)
+        return inline_images
 
     def host_inline_image(self, inline_image):
+        """
+        Save ``inline_image`` to the default storage, unless it's already
+        there, and return its URL.
+
+        URLs are memoized by this process and, when
+        TEMPLATED_EMAIL_INLINE_IMAGE_CACHE_ALIAS names a cache, shared with
+        the others, so repeated images don't reach the storage.
+        """
         from templated_email.urls import app_name
-        md5sum = hashlib.md5(inline_image.content).hexdigest()
 
-        filename = inline_image.filename
-        filename = app_name + '/' + md5sum + filename
-        if not default_storage.exists(filename):
-            filename = default_storage.save(filename,
-                                            BytesIO(inline_image.content))
-        return default_storage.url(filename)
+        name = app_name + '/' + inline_image.md5 + inline_image.filename
+        url = _hosted_image_urls.get(name)
+        if url is not None:
+            return url
 
-    def _render_email(self, template_name, context,
-                      template_dir=None, file_extension=None):
-        response = {}
-        errors = {}
+        cache = None
+        cache_alias = getattr(settings, 'TEMPLATED_EMAIL_INLINE_IMAGE_CACHE_ALIAS', None)
+        if cache_alias:
+            cache = caches[cache_alias]
+            cache_key = 'templated_email:hosted:%s' % hashlib.md5(name.encode('utf-8')).hexdigest()
+            url = cache.get(cache_key)
+
+        if url is None:
+            filename = name
+            if not default_storage.exists(filename):
+                with inline_image.open() as image_file:
+                    filename = default_storage.save(filename, image_file)
+            url = default_storage.url(filename)
+            if cache is not None:
+                cache.set(cache_key, url,
+                          getattr(settings, 'TEMPLATED_EMAIL_INLINE_IMAGE_CACHE_TIMEOUT', None))
+
+        _hosted_image_urls.set(name, url)
+        return url
 
+    def _get_template_names(self, template_name,
+                            template_dir=None, file_extension=None):
         file_extension = file_extension or self.template_suffix
         if file_extension.startswith('.'):
             file_extension = file_extension[1:]
@@ -99,69 +463,367 @@ class TemplateBackend(object):
             if not one_full_template_name.endswith(template_extension):
                 one_full_template_name += template_extension
             full_template_names.append(one_full_template_name)
+        return full_template_names
 
-        for part in ['subject', 'html', 'plain']:
-            render_context = Context(context, autoescape=(part == 'html'))
+    def _collect_blocks(self, template, context):
+        """
+        Walk the {% extends %} chain of ``template`` and return a list with
+        the blocks declared by each template, from the child to the root,
+        and whether the chain is the same for every context.
+        """
+        blocks = []
+        static = True
+        while template is not None:
+            blocks.append({node.name: node for node in
+                           template.nodelist.get_nodes_by_type(BlockNode)})
+            extends_nodes = template.nodelist.get_nodes_by_type(ExtendsNode)
+            if extends_nodes:
+                parent_name = extends_nodes[0].parent_name
+                static = static and isinstance(parent_name.var, str) and not parent_name.filters
+                template = extends_nodes[0].get_parent(context)
+            else:
+                template = None
+        return blocks, static
+
+    def _get_compiled_template(self, template_name,
+                               template_dir=None, file_extension=None):
+        if isinstance(template_name, (tuple, list, )):
+            template_names = tuple(template_name)
+        else:
+            template_names = (template_name, )
+        key = (template_dir or self.template_prefix,
+               file_extension or self.template_suffix,
+               template_names)
+
+        compiled = _template_cache.get(key)
+        if compiled is None:
+            full_template_names = self._get_template_names(
+                template_name, template_dir, file_extension)
+            compiled = CompiledEmailTemplate(
+                loader.select_template(full_template_names),
+                full_template_names)
+            _template_cache.set(key, compiled)
+        return compiled
+
+    def find_templates(self, template_dir=None, file_extension=None):
+        """
+        Return the sorted names, as given to send, of every template found
+        by the template loaders under the template directory.
+        """
+        template_dir = template_dir or self.template_prefix
+        file_extension = file_extension or self.template_suffix
+        if not file_extension.startswith('.'):
+            file_extension = '.' + file_extension
+
+        template_names = set()
+        for name in _iter_loader_templates():
+            if name.startswith(template_dir) and name.endswith(file_extension):
+                template_names.add(name[len(template_dir):-len(file_extension)])
+        return sorted(template_names)
+
+    def warm_template(self, template_name,
+                      template_dir=None, file_extension=None):
+        """
+        Load ``template_name`` and index the blocks of its inheritance chain
+        ahead of the first render, when the chain doesn't depend on the
+        context.
+        """
+        compiled = self._get_compiled_template(
+            template_name, template_dir, file_extension)
+        if compiled.blocks is None and isinstance(compiled.template, DjangoTemplate):
+            template = compiled.template.template
+            context = Context()
+            with context.render_context.push_state(template):
+                with context.bind_template(template):
+                    blocks, static = self._collect_blocks(template, context)
+            if static:
+                compiled.set_blocks(blocks)
+        return compiled
+
+    def warm_templates(self, template_names=None,
+                       template_dir=None, file_extension=None):
+        """
+        Warm every template of ``template_names``, by default all of those
+        returned by find_templates, and return a list of
+        (template_name, seconds, error) tuples, error being None on success.
+        """
+        if template_names is None:
+            template_names = self.find_templates(template_dir, file_extension)
+        results = []
+        for template_name in template_names:
+            error = None
+            start = time.perf_counter()
+            try:
+                self.warm_template(template_name, template_dir, file_extension)
+            except Exception as e:
+                error = e
+            results.append((template_name, time.perf_counter() - start, error))
+        return results
+
+    def get_template_variables(self, template_name,
+                               template_dir=None, file_extension=None):
+        """
+        Return a dict mapping each part ``template_name`` defines, among
+        'subject', 'html' and 'plain', to the frozenset of the context
+        variables it uses, or to None when they can't be listed, e.g. when
+        the template uses custom tags.
+        """
+        compiled = self._get_compiled_template(
+            template_name, template_dir, file_extension)
+        return dict(compiled.get_variables())
+
+    def get_missing_variables(self, template_name, context,
+                              template_dir=None, file_extension=None):
+        """
+        Return the set of the variables used by ``template_name`` that are
+        missing from ``context``, or None when they can't be listed, so
+        contexts can be checked before a mass send.
+
+        Names the template sets itself, e.g. with {% url ... as name %},
+        may be reported as missing.
+        """
+        variables = self.get_template_variables(template_name, template_dir,
+                                                file_extension)
+        if any(names is None for names in variables.values()):
+            return None
+        return {name for names in variables.values() for name in names
+                if name not in context}
+
+    def _get_part_context(self, compiled, part, context):
+        """
+        Return the context ``part`` is rendered with, only holding the
+        variables it uses when TEMPLATED_EMAIL_PRUNE_CONTEXT is set.
+        """
+        if not getattr(settings, 'TEMPLATED_EMAIL_PRUNE_CONTEXT', False):
+            return context
+        names = compiled.get_variables().get(part)
+        if names is None:
+            return context
+        return {name: context[name] for name in names if name in context}
+
+    def _render_blocks(self, compiled, parts, context, template_name=None):
+        """
+        Render every block in ``parts`` from a CompiledEmailTemplate.
+
+        The inheritance chain is walked at most once and shared by every
+        part, each part getting a fresh Context so that only the html block
+        is autoescaped. Returns a tuple of (rendered parts, errors).
+        """
+        response = {}
+        errors = {}
+
+        if not isinstance(compiled.template, DjangoTemplate):
+            # Other engines are left to django-render-block, block by block.
+            for part in parts:
+                started = stage_started(type(self))
+                render_context = Context(self._get_part_context(compiled, part, context),
+                                         autoescape=(part == 'html'))
+                try:
+                    response[part] = render_block_to_string(
+                        compiled.full_template_names, part, render_context)
+                except BlockNotFound as error:
+                    errors[part] = error
+                else:
+                    stage_finished(type(self), started, 'render', template_name,
+                                   part=part)
+            return response, errors
+
+        template = compiled.template.template
+        blocks = compiled.blocks
+        for part in parts:
+            if compiled.parts is not None and part not in compiled.parts:
+                errors[part] = BlockNotFound("block with name '%s' does not exist" % part)
+                continue
+
+            started = stage_started(type(self))
+            render_context = Context(self._get_part_context(compiled, part, context),
+                                     autoescape=(part == 'html'))
+            with render_context.render_context.push_state(template):
+                with render_context.bind_template(template):
+                    if blocks is None:
+                        blocks, static = self._collect_blocks(template, render_context)
+                        if static:
+                            compiled.set_blocks(blocks)
+                    block_context = BlockContext()
+                    for template_blocks in blocks:
+                        block_context.add_blocks(template_blocks)
+                    render_context.render_context[BLOCK_CONTEXT_KEY] = block_context
+
+                    block_node = block_context.get_block(part)
+                    if block_node is None:
+                        errors[part] = BlockNotFound("block with name '%s' does not exist" % part)
+                        continue
+                    response[part] = block_node.render(render_context)
+            stage_finished(type(self), started, 'render', template_name, part=part)
+
+        return response, errors
+
+    def _get_context_render_cache_keys(self, compiled, context):
+        """
+        Return a render_cache_key dict whose key for each part is a digest
+        of the values of the variables it uses, leaving out the parts whose
+        variables can't be listed or pickled, or hold InlineImages.
+        """
+        render_cache_keys = {}
+        for part, names in compiled.get_variables().items():
+            if names is None:
+                continue
+            values = []
+            for name in sorted(names):
+                if name in context:
+                    value = context[name]
+                    if type(value) is LazyValue:
+                        value = value()
+                    values.append((name, value))
+            data = BytesIO()
             try:
-                response[part] = render_block_to_string(full_template_names, part, render_context)
-            except BlockNotFound as error:
-                errors[part] = error
+                _RenderCacheKeyPickler(data, pickle.HIGHEST_PROTOCOL).dump(values)
+            except Exception:
+                continue
+            render_cache_keys[part] = hashlib.sha256(data.getvalue()).hexdigest()
+        return render_cache_keys
+
+    def _get_render_cache_key(self, compiled, part, render_cache_key):
+        key = repr((compiled.full_template_names, part, get_language(),
+                    render_cache_key))
+        return 'templated_email:render:%s' % hashlib.md5(key.encode('utf-8')).hexdigest()
+
+    def _render_email(self, template_name, context,
+                      template_dir=None, file_extension=None,
+                      render_cache_key=None, link_context=None):
+        """
+        Render the subject, html and plain parts of an email.
+
+        With a ``link_context`` the html block is also rendered against it
+        from the same resolved template, InlineImages pointing to their hosted
+        copy, and returned as the 'static_html' part to be saved for the web.
+
+        When TEMPLATED_EMAIL_RENDER_CACHE_ALIAS names a cache, parts can be
+        shared between renders: ``render_cache_key`` states that every render
+        with that key gives the same parts, whatever the context. It may also
+        be a dict mapping some of the part names to their key, so the other
+        parts are still rendered for each context, or True to key each part
+        by the values of the context variables it uses.
+        """
+        started = stage_started(type(self))
+        compiled = self._get_compiled_template(
+            template_name, template_dir, file_extension)
+        stage_finished(type(self), started, 'resolve', template_name)
+
+        cache_alias = getattr(settings, 'TEMPLATED_EMAIL_RENDER_CACHE_ALIAS', None)
+        cache_keys = {}
+        cached = {}
+        if render_cache_key is not None and cache_alias:
+            cache = caches[cache_alias]
+            if render_cache_key is True:
+                render_cache_key = self._get_context_render_cache_keys(compiled, context)
+            elif not isinstance(render_cache_key, dict):
+                render_cache_key = dict.fromkeys(EMAIL_PARTS, render_cache_key)
+            cache_keys = {part: self._get_render_cache_key(compiled, part, key)
+                          for part, key in render_cache_key.items()
+                          if part in EMAIL_PARTS}
+            found = cache.get_many(cache_keys.values())
+            cached = {part: found[key] for part, key in cache_keys.items()
+                      if key in found}
+
+        parts = [part for part in EMAIL_PARTS if part not in cached]
+        if cache_keys:
+            # The Content-IDs of InlineImages belong to this message, the
+            # parts rendering one are left out of the cache.
+            response, errors = {}, {}
+            for part in parts:
+                with record_inline_images() as inline_images:
+                    part_response, part_errors = self._render_blocks(
+                        compiled, [part], context, template_name=template_name)
+                response.update(part_response)
+                errors.update(part_errors)
+                if inline_images:
+                    cache_keys.pop(part, None)
+            cache.set_many(
+                {cache_keys[part]: value for part, value in response.items()
+                 if part in cache_keys},
+                getattr(settings, 'TEMPLATED_EMAIL_RENDER_CACHE_TIMEOUT', 300))
+            response.update(cached)
+        else:
+            response, errors = self._render_blocks(compiled, parts, context,
+                                                   template_name=template_name)
 
         if response == {}:
             raise EmailRenderException("Couldn't render email parts. Errors: %s"
                                        % errors)
 
+        if link_context is not None and 'html' in response:
+            hosted_images = {}
+
+            def host_inline_image(inline_image):
+                if inline_image not in hosted_images:
+                    hosted_images[inline_image] = self.host_inline_image(inline_image)
+                return hosted_images[inline_image]
+
+            with resolve_inline_images(host_inline_image):
+                static_parts = self._render_blocks(compiled, ['html'], link_context,
+                                                   template_name=template_name)[0]
+            response['static_html'] = static_parts['html']
+
         return response
 
     def get_email_message(self, template_name, context, from_email=None, to=None,
                           cc=None, bcc=None, headers=None,
                           template_prefix=None, template_suffix=None,
                           template_dir=None, file_extension=None,
-                          attachments=None, create_link=False):
+                          attachments=None, create_link=False,
+                          render_cache_key=None, saved_emails=None):
+        """
+        Render and return an EmailMessage.
 
+        With ``create_link``, a SavedEmail copy of the html part is written
+        right away, unless a ``saved_emails`` list is given: the unsaved
+        SavedEmail is then appended to it, for the caller to write it in bulk
+        before sending the message.
+        """
+
+        context = lazy_context(context)
+        link_context = None
         if create_link:
+            # The rendered parts hold a per message uuid, they can't be shared.
+            render_cache_key = None
             email_uuid = uuid.uuid4()
-            link_context = dict(context)
-            context['email_uuid'] = email_uuid.hex
-            for key, value in context.items():
-                if isinstance(value, InlineImage):
-                    link_context[key] = self.host_inline_image(value)
+            link_context = context
+            context = context.new_child({'email_uuid': email_uuid.hex})
 
         EmailMessage = get_emailmessage_klass()
         EmailMultiAlternatives = get_emailmultialternatives_klass()
-        parts = self._render_email(template_name, context,
-                                   template_prefix or template_dir,
-                                   template_suffix or file_extension)
+        with record_inline_images() as inline_images:
+            parts = self._render_email(template_name, context,
+                                       template_prefix or template_dir,
+                                       template_suffix or file_extension,
+                                       render_cache_key=render_cache_key,
+                                       link_context=link_context)
+        static_html_part = parts.pop('static_html', None)
         plain_part = 'plain' in parts
         html_part = 'html' in parts
 
         if create_link and html_part:
-            static_html_part = self._render_email(
-                template_name, link_context,
-                template_prefix or template_dir,
-                template_suffix or file_extension)['html']
             from templated_email.models import SavedEmail
-            SavedEmail.objects.create(content=static_html_part, uuid=email_uuid)
+            saved_email = SavedEmail(html=static_html_part, uuid=email_uuid)
+            if saved_emails is None:
+                started = stage_started(type(self))
+                saved_email.save()
+                stage_finished(type(self), started, 'save_email', template_name)
+            else:
+                saved_emails.append(saved_email)
 
         if 'subject' in parts:
             subject = parts['subject']
         else:
-            subject_dict = getattr(settings, 'TEMPLATED_EMAIL_DJANGO_SUBJECTS', {})
-            if isinstance(template_name, (list, tuple)):
-                for template in template_name:
-                    if template in subject_dict:
-                        subject_template = subject_dict[template]
-                        break
-                else:
-                    subject_template = _('%s email subject' % template_name[0])
-            else:
-                subject_template = subject_dict.get(template_name,
-                                                    _('%s email subject' % template_name))
-            subject = subject_template % context
+            subject = get_subject_template(template_name).render(context)
         subject = subject.strip('\n\r').replace('\n', ' ').replace('\r', ' ')  # strip newlines from subject
 
         if not plain_part:
+            started = stage_started(type(self))
             plain_part = self._generate_plain_part(parts)
+            if plain_part:
+                stage_finished(type(self), started, 'plain', template_name)
 
         if plain_part and not html_part:
             e = EmailMessage(
@@ -204,7 +866,9 @@ class TemplateBackend(object):
         else:
             raise EmailRenderException("Please specify at a plain and/or html block.")
 
-        self.attach_inline_images(e, context)
+        started = stage_started(type(self))
+        self.attach_inline_images(e, context, inline_images)
+        stage_finished(type(self), started, 'attach_images', template_name)
         return e
 
     def _generate_plain_part(self, parts):
@@ -213,11 +877,12 @@ class TemplateBackend(object):
 
         The user can choose a custom "plain function" that takes an argument
         of the HTML part and returns the plain text. By default this is
-        "html2text.html2text".
+        "html2text.html2text". Conversions are memoized, so identical HTML
+        parts are converted only once.
         """
         html_part = 'html' in parts
         auto_plain = getattr(settings, 'TEMPLATED_EMAIL_AUTO_PLAIN', True)
-        plain_func = getattr(settings, 'TEMPLATED_EMAIL_PLAIN_FUNCTION', None)
+        plain_func = get_plain_function()
 
         if not auto_plain:
             return
@@ -225,13 +890,15 @@ class TemplateBackend(object):
         if not html_part:
             return
 
-        if not plain_func and html2text:
-            plain_func = html2text.html2text
-
         if not plain_func:
             return
 
-        parts['plain'] = plain_func(parts['html'])
+        key = (plain_func, hashlib.md5(parts['html'].encode('utf-8')).hexdigest())
+        plain = _plain_cache.get(key)
+        if plain is None:
+            plain = plain_func(parts['html'])
+            _plain_cache.set(key, plain)
+        parts['plain'] = plain
         return True
 
     def send(self, template_name, from_email, recipient_list, context,
@@ -242,11 +909,28 @@ class TemplateBackend(object):
              template_dir=None, file_extension=None,
              auth_user=None, auth_password=None,
              connection=None, attachments=None,
-             create_link=False, **kwargs):
+             create_link=False, render_cache_key=None, queue=None, **kwargs):
+        """
+        Render and send an email, returning its Message-Id if any.
 
-        connection = connection or get_connection(username=auth_user,
-                                                  password=auth_password,
-                                                  fail_silently=fail_silently)
+        With ``queue`` (the TEMPLATED_EMAIL_QUEUE setting by default) the
+        rendered message is only written to the QueuedEmail outbox, to be
+        sent later by the send_queued_emails command with the default
+        credentials, and is always given a Message-Id.
+        """
+        if queue is None:
+            queue = getattr(settings, 'TEMPLATED_EMAIL_QUEUE', False)
+        if queue:
+            if connection or auth_user or auth_password:
+                raise ValueError("Queued emails are sent with the default "
+                                 "connection and credentials.")
+            headers = _with_message_id(headers)
+
+        pool = None if connection or queue else get_connection_pool()
+        if pool is None and not queue:
+            connection = connection or get_connection(username=auth_user,
+                                                      password=auth_password,
+                                                      fail_silently=fail_silently)
 
         e = self.get_email_message(template_name, context, from_email=from_email,
                                    to=recipient_list, cc=cc, bcc=bcc, headers=headers,
@@ -255,13 +939,343 @@ class TemplateBackend(object):
                                    template_dir=template_dir,
                                    file_extension=file_extension,
                                    attachments=attachments,
-                                   create_link=create_link)
+                                   create_link=create_link,
+                                   render_cache_key=render_cache_key)
 
-        e.connection = connection
+        if queue:
+            from templated_email.models import QueuedEmail
+            started = stage_started(type(self))
+            queued_email = QueuedEmail()
+            queued_email.message = e
+            queued_email.save()
+            stage_finished(type(self), started, 'queue', template_name)
+            return get_message_id(e.extra_headers)
 
+        started = stage_started(type(self))
         try:
-            e.send(fail_silently)
+            if pool is None:
+                e.connection = connection
+                e.send(fail_silently)
+            elif e.recipients():
+                pool.send_messages([e], username=auth_user,
+                                   password=auth_password,
+                                   fail_silently=fail_silently)
         except NameError:
             raise EmailRenderException("Couldn't render plain or html parts")
+        stage_finished(type(self), started, 'send', template_name)
+
+        return get_message_id(e.extra_headers)
+
+    def _get_render_executor(self, render_workers, render_pool):
+        if render_pool == 'thread':
+            return (ThreadPoolExecutor(render_workers),
+                    partial(_render_in_worker, backend=self))
+        if render_pool == 'process':
+            backend_kwargs = {'template_prefix': self.template_prefix,
+                              'template_suffix': self.template_suffix}
+            executor = ProcessPoolExecutor(
+                render_workers, initializer=_init_render_worker,
+                initargs=(type(self), backend_kwargs))
+            return executor, _render_in_worker
+        raise ImproperlyConfigured(
+            "TEMPLATED_EMAIL_RENDER_POOL must be 'thread' or 'process', got %r"
+            % (render_pool, ))
+
+    def _get_mass_message_kwargs(self, recipient_list, context, headers=None,
+                                 **kwargs):
+        """
+        Return the get_email_message keyword arguments of one message of a
+        mass send, each message getting its own Message-Id.
+        """
+        if isinstance(recipient_list, str):
+            recipient_list = [recipient_list]
+        return dict(kwargs, context=context, to=recipient_list,
+                    headers=_with_message_id(headers))
+
+    def _render_mass(self, template_name, messages_kwargs, executor=None, render=None):
+        """
+        Render one message per item of ``messages_kwargs``, keyword arguments
+        for get_email_message holding the context, and yield (index, message,
+        saved_emails, error) tuples as soon as each of them is rendered.
+
+        With an ``executor`` the messages are rendered by its pool through
+        ``render``, so they are yielded in completion order.
+        """
+        if executor is None:
+            for index, message_kwargs in enumerate(messages_kwargs):
+                message_kwargs = dict(message_kwargs)
+                context = message_kwargs.pop('context')
+                try:
+                    message, saved_emails = _render_in_worker(
+                        template_name, context, message_kwargs, backend=self)
+                except Exception as error:
+                    yield index, None, [], error
+                else:
+                    yield index, message, saved_emails, None
+            return
+
+        futures = {}
+        for index, message_kwargs in enumerate(messages_kwargs):
+            message_kwargs = dict(message_kwargs)
+            context = message_kwargs.pop('context')
+            futures[executor.submit(render, template_name, context, message_kwargs)] = index
+        for future in as_completed(futures):
+            try:
+                message, saved_emails = future.result()
+            except Exception as error:
+                yield futures[future], None, [], error
+            else:
+                yield futures[future], message, saved_emails, None
+
+    def _send_mass_iter(self, template_name, from_email, recipients_with_contexts,
+                        cc=None, bcc=None,
+                        fail_silently=False,
+                        headers=None,
+                        template_prefix=None, template_suffix=None,
+                        template_dir=None, file_extension=None,
+                        auth_user=None, auth_password=None,
+                        connection=None, attachments=None,
+                        create_link=False, render_cache_key=None,
+                        render_workers=None, render_pool=None,
+                        chunk_size=None, saved_email_batch_size=None, **kwargs):
+        """
+        Yield (index, SendResult) tuples, index being the position of the
+        recipient in ``recipients_with_contexts``. See send_mass_iter.
+        """
+        from templated_email.models import SavedEmail
+
+        if render_workers is None:
+            render_workers = getattr(settings, 'TEMPLATED_EMAIL_RENDER_WORKERS', None)
+        if render_pool is None:
+            render_pool = getattr(settings, 'TEMPLATED_EMAIL_RENDER_POOL', 'thread')
+        if chunk_size is None:
+            chunk_size = getattr(settings, 'TEMPLATED_EMAIL_MASS_MAIL_CHUNK_SIZE', 500)
+        if saved_email_batch_size is None:
+            saved_email_batch_size = getattr(
+                settings, 'TEMPLATED_EMAIL_SAVED_EMAIL_BATCH_SIZE', 100)
+
+        executor = render = None
+        if render_workers:
+            executor, render = self._get_render_executor(render_workers, render_pool)
+
+        connection_ready = opened = False
+
+        def send(e):
+            nonlocal connection, connection_ready, opened
+            if not connection_ready:
+                # Only connect once there is something to send.
+                connection = connection or get_connection(username=auth_user,
+                                                          password=auth_password,
+                                                          fail_silently=fail_silently)
+                opened = connection.open()
+                connection_ready = True
+
+            e.connection = connection
+            started = stage_started(type(self))
+            try:
+                try:
+                    sent = connection.send_messages([e])
+                except RECONNECT_ERRORS:
+                    # The connection dropped, reopen it once rather than
+                    # failing every remaining recipient.
+                    try:
+                        connection.close()
+                    except Exception:
+                        pass
+                    connection.open()
+                    sent = connection.send_messages([e])
+            except Exception as error:
+                return SendResult(e.to, None, error)
+            stage_finished(type(self), started, 'send', template_name)
+            message_id = get_message_id(e.extra_headers) if sent else None
+            return SendResult(e.to, message_id, None)
+
+        def flush(linked_messages):
+            # The saved emails are written before sending the messages
+            # linking to them.
+            saved_emails = [saved_email for index, e, message_saved_emails in linked_messages
+                            for saved_email in message_saved_emails]
+            started = stage_started(type(self))
+            try:
+                SavedEmail.objects.bulk_create(saved_emails,
+                                               batch_size=saved_email_batch_size)
+            except Exception as error:
+                for index, e, message_saved_emails in linked_messages:
+                    yield index, SendResult(e.to, None, error)
+                return
+            stage_finished(type(self), started, 'save_email', template_name,
+                           count=len(saved_emails))
+            for index, e, message_saved_emails in linked_messages:
+                yield index, send(e)
+
+        recipients_with_contexts = iter(recipients_with_contexts)
+        offset = 0
+        try:
+            while True:
+                messages_kwargs = []
+                for recipient_list, context in islice(recipients_with_contexts, chunk_size):
+                    messages_kwargs.append(self._get_mass_message_kwargs(
+                        recipient_list, context, from_email=from_email,
+                        cc=cc, bcc=bcc, headers=headers,
+                        template_prefix=template_prefix,
+                        template_suffix=template_suffix,
+                        template_dir=template_dir,
+                        file_extension=file_extension,
+                        attachments=attachments,
+                        create_link=create_link,
+                        render_cache_key=render_cache_key))
+                if not messages_kwargs:
+                    break
 
-        return e.extra_headers.get('Message-Id', None)
+                linked_messages = []
+                saved_emails_count = 0
+                for index, e, saved_emails, error in self._render_mass(
+                        template_name, messages_kwargs, executor, render):
+                    if error is not None:
+                        yield offset + index, SendResult(messages_kwargs[index]['to'], None, error)
+                    elif saved_emails:
+                        linked_messages.append((offset + index, e, saved_emails))
+                        saved_emails_count += len(saved_emails)
+                        if saved_emails_count >= saved_email_batch_size:
+                            yield from flush(linked_messages)
+                            linked_messages = []
+                            saved_emails_count = 0
+                    else:
+                        yield offset + index, send(e)
+                if linked_messages:
+                    yield from flush(linked_messages)
+                offset += len(messages_kwargs)
+        finally:
+            if opened:
+                connection.close()
+            if executor is not None:
+                executor.shutdown()
+
+    def send_mass_iter(self, template_name, from_email, recipients_with_contexts,
+                       **kwargs):
+        """
+        Lazily render and send one message per (recipient_list, context)
+        pair of ``recipients_with_contexts``, which may be any iterable, for
+        instance a generator over a QuerySet.iterator().
+
+        Recipients are consumed in chunks of ``chunk_size`` (the
+        TEMPLATED_EMAIL_MASS_MAIL_CHUNK_SIZE setting by default), so memory
+        use depends on the chunk size and not on the number of recipients.
+        Yields a SendResult for each message as soon as it is sent, taking
+        the same arguments as send_mass.
+        """
+        for index, result in self._send_mass_iter(
+                template_name, from_email, recipients_with_contexts, **kwargs):
+            yield result
+
+    def send_mass(self, template_name, from_email, recipients_with_contexts,
+                  **kwargs):
+        """
+        Render one message per (recipient_list, context) pair of
+        ``recipients_with_contexts`` and send all of them over a single
+        connection, opened once for the whole batch.
+
+        A recipient_list may also be a single address. Errors are reported
+        per recipient instead of being raised: returns a list of SendResult,
+        in the same order as ``recipients_with_contexts``.
+
+        Rendering can be spread over ``render_workers`` threads or processes,
+        as chosen by ``render_pool`` ('thread' or 'process'), which default
+        to the TEMPLATED_EMAIL_RENDER_WORKERS and TEMPLATED_EMAIL_RENDER_POOL
+        settings. Messages are sent as soon as they are rendered.
+        """
+        results = {}
+        for index, result in self._send_mass_iter(
+                template_name, from_email, recipients_with_contexts, **kwargs):
+            results[index] = result
+        return [results[index] for index in range(len(results))]
+
+    async def aget_email_message(self, template_name, context, **kwargs):
+        """
+        Async version of get_email_message, rendering on the executor
+        returned by get_async_executor.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            get_async_executor(),
+            partial(self.get_email_message, template_name, context, **kwargs))
+
+    async def asend(self, template_name, from_email, recipient_list, context,
+                    **kwargs):
+        """
+        Async version of send, rendering and sending on the executor returned
+        by get_async_executor. Pass a ``connection`` to reuse it across calls.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            get_async_executor(),
+            partial(self.send, template_name, from_email, recipient_list,
+                    context, **kwargs))
+
+    async def asend_mass(self, template_name, from_email, recipients_with_contexts,
+                         cc=None, bcc=None,
+                         fail_silently=False,
+                         headers=None,
+                         template_prefix=None, template_suffix=None,
+                         template_dir=None, file_extension=None,
+                         auth_user=None, auth_password=None,
+                         connection=None, attachments=None,
+                         create_link=False, render_cache_key=None,
+                         concurrency=None, **kwargs):
+        """
+        Async version of send_mass.
+
+        Up to ``concurrency`` messages (the TEMPLATED_EMAIL_ASYNC_CONCURRENCY
+        setting by default) are rendered at the same time on the executor
+        returned by get_async_executor, while the rendered ones are sent one
+        after the other over a single connection.
+        """
+        loop = asyncio.get_running_loop()
+        executor = get_async_executor()
+        if concurrency is None:
+            concurrency = getattr(settings, 'TEMPLATED_EMAIL_ASYNC_CONCURRENCY', 10)
+        semaphore = asyncio.Semaphore(concurrency)
+        send_lock = asyncio.Lock()
+
+        connection = connection or get_connection(username=auth_user,
+                                                  password=auth_password,
+                                                  fail_silently=fail_silently)
+
+        async def send_one(message_kwargs):
+            recipient_list = message_kwargs['to']
+            async with semaphore:
+                try:
+                    e = await loop.run_in_executor(
+                        executor,
+                        partial(self.get_email_message, template_name, **message_kwargs))
+                except Exception as error:
+                    return SendResult(recipient_list, None, error)
+
+            e.connection = connection
+            async with send_lock:
+                started = stage_started(type(self))
+                try:
+                    sent = await loop.run_in_executor(executor, connection.send_messages, [e])
+                except Exception as error:
+                    return SendResult(recipient_list, None, error)
+                stage_finished(type(self), started, 'send', template_name)
+            message_id = get_message_id(e.extra_headers) if sent else None
+            return SendResult(recipient_list, message_id, None)
+
+        opened = await loop.run_in_executor(executor, connection.open)
+        try:
+            return await asyncio.gather(*(
+                send_one(self._get_mass_message_kwargs(
+                    recipient_list, context, from_email=from_email,
+                    cc=cc, bcc=bcc, headers=headers,
+                    template_prefix=template_prefix,
+                    template_suffix=template_suffix,
+                    template_dir=template_dir,
+                    file_extension=file_extension,
+                    attachments=attachments,
+                    create_link=create_link,
+                    render_cache_key=render_cache_key))
+                for recipient_list, context in recipients_with_contexts))
+        finally:
+            if opened:
+                await loop.run_in_executor(executor, connection.close)
@@ -0,0 +1,186 @@
+import smtplib
+import threading
+import time
+
+from django.conf import settings
+from django.core import mail
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+
+# Errors after which a pooled connection is considered dead: the message is
+# sent again once over a fresh connection.
+RECONNECT_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError)
+
+
+class PooledConnection(object):
+    """
+    An open mail connection kept by ConnectionPool, with the bookkeeping
+    needed to retire it.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.sent = 0
+        self.last_used = time.monotonic()
+
+    def open(self):
+        self.connection.open()
+        self.last_used = time.monotonic()
+
+    def close(self):
+        try:
+            self.connection.close()
+        except Exception:
+            # The session is being thrown away, it may well be broken.
+            pass
+
+
+class ConnectionPool(object):
+    """
+    Thread-safe pool of open mail connections, keyed by (EMAIL_BACKEND,
+    auth_user).
+
+    A connection is used by one thread at a time and given back to the pool
+    once the messages are sent. Connections idle for more than ``max_idle``
+    seconds or which sent ``max_messages`` messages are closed instead of
+    being reused, and at most ``max_size`` idle connections are kept per key.
+    """
+
+    def __init__(self, max_idle=30, max_messages=100, max_size=10):
+        self.max_idle = max_idle
+        self.max_messages = max_messages
+        self.max_size = max_size
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def _get_key(self, username):
+        return (settings.EMAIL_BACKEND, username)
+
+    def _is_expired(self, pooled, now):
+        return (now - pooled.last_used > self.max_idle
+                or pooled.sent >= self.max_messages)
+
+    def acquire(self, username=None, password=None):
+        """
+        Return an open PooledConnection, reusing an idle one when possible.
+
+        Connections are shared by callers with different fail_silently
+        values, so they always raise: send_messages() applies fail_silently.
+        """
+        key = self._get_key(username)
+        now = time.monotonic()
+        expired = []
+        pooled = None
+        with self._lock:
+            idle = self._idle.get(key, [])
+            while idle:
+                candidate = idle.pop()
+                if self._is_expired(candidate, now):
+                    expired.append(candidate)
+                else:
+                    pooled = candidate
+                    break
+        # Closing may block on the network, keep it outside of the lock.
+        for candidate in expired:
+            candidate.close()
+        if pooled is None:
+            pooled = self._connect(username, password)
+        return pooled
+
+    def _connect(self, username, password):
+        pooled = PooledConnection(mail.get_connection(
+            username=username, password=password))
+        pooled.open()
+        return pooled
+
+    def release(self, pooled, username=None, discard=False):
+        """
+        Give ``pooled`` back to the pool, or close it when it's discarded,
+        expired or the pool is full.
+        """
+        key = self._get_key(username)
+        pooled.last_used = time.monotonic()
+        if not discard and not self._is_expired(pooled, pooled.last_used):
+            with self._lock:
+                idle = self._idle.setdefault(key, [])
+                if len(idle) < self.max_size:
+                    idle.append(pooled)
+                    return
+        pooled.close()
+
+    def send_messages(self, messages, username=None, password=None,
+                      fail_silently=False):
+        """
+        Send ``messages`` over a pooled connection, reconnecting once when
+        the connection turns out to be dead, and return how many were sent.
+        With ``fail_silently`` errors are swallowed and 0 is returned.
+        """
+        try:
+            pooled = self.acquire(username, password)
+        except Exception:
+            if fail_silently:
+                return 0
+            raise
+        try:
+            try:
+                sent = pooled.connection.send_messages(messages)
+            except RECONNECT_ERRORS:
+                pooled.close()
+                pooled = self._connect(username, password)
+                sent = pooled.connection.send_messages(messages)
+        except Exception:
+            self.release(pooled, username, discard=True)
+            if fail_silently:
+                return 0
+            raise
+        pooled.sent += sent or 0
+        self.release(pooled, username)
+        return sent
+
+    def close(self):
+        """Close every idle connection."""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for pooled in connections:
+                pooled.close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_connection_pool():
+    """
+    Return the ConnectionPool of this process, or None unless
+    TEMPLATED_EMAIL_CONNECTION_POOL is enabled.
+    """
+    global _pool
+    if not getattr(settings, 'TEMPLATED_EMAIL_CONNECTION_POOL', False):
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = create_connection_pool()
+        return _pool
+
+
+def create_connection_pool():
+    """
+    Return a new ConnectionPool configured by the
+    TEMPLATED_EMAIL_CONNECTION_POOL_* settings.
+    """
+    return ConnectionPool(
+        max_idle=getattr(settings, 'TEMPLATED_EMAIL_CONNECTION_POOL_MAX_IDLE', 30),
+        max_messages=getattr(settings, 'TEMPLATED_EMAIL_CONNECTION_POOL_MAX_MESSAGES', 100),
+        max_size=getattr(settings, 'TEMPLATED_EMAIL_CONNECTION_POOL_SIZE', 10))
+
+
+@receiver(setting_changed, dispatch_uid='templated_email_pool_setting_changed')
+def _reset_connection_pool(sender, setting, **kwargs):
+    global _pool
+    if setting == 'EMAIL_BACKEND' or setting.startswith('TEMPLATED_EMAIL_CONNECTION_POOL'):
+        with _pool_lock:
+            if _pool is not None:
+                _pool.close()
+            _pool = None
@@ -0,0 +1,64 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from templated_email.models import SavedEmail, SavedEmailContent
+
+
+class Command(BaseCommand):
+    help = ("Delete the saved emails older than a given age, and the bodies "
+            "no longer used by any email nor saved with one since, in "
+            "batches.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int,
+            default=getattr(settings, 'TEMPLATED_EMAIL_SAVED_EMAIL_MAX_AGE', None),
+            help="Delete the emails saved more than this many days ago. "
+                 "Defaults to the TEMPLATED_EMAIL_SAVED_EMAIL_MAX_AGE setting.")
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help="How many emails are deleted by each query.")
+
+    def handle(self, *args, **options):
+        days = options['days']
+        batch_size = options['batch_size']
+        if days is None:
+            raise CommandError(
+                "Pass --days or set TEMPLATED_EMAIL_SAVED_EMAIL_MAX_AGE.")
+        if batch_size < 1:
+            raise CommandError("--batch-size must be a positive number.")
+
+        cutoff = timezone.now() - timedelta(days=days)
+        expired = SavedEmail.objects.filter(created__lt=cutoff).order_by('pk')
+        deleted = 0
+        while True:
+            pks = list(expired.values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                break
+            deleted += SavedEmail.objects.filter(pk__in=pks).delete()[0]
+
+        # A send may be reusing an orphan body: it bumps last_used before
+        # saving its email, so recent bodies are kept, and the rows are locked
+        # and checked again before being deleted.
+        unused = ~Exists(SavedEmail.objects.filter(body=OuterRef('pk')))
+        orphans = SavedEmailContent.objects.filter(
+            unused, last_used__lt=cutoff).order_by('pk')
+        deleted_bodies = 0
+        while True:
+            pks = list(orphans.values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                break
+            with transaction.atomic():
+                locked = SavedEmailContent.objects.filter(
+                    pk__in=pks, last_used__lt=cutoff).select_for_update()
+                locked = list(locked.filter(unused).values_list('pk', flat=True))
+                deleted_bodies += SavedEmailContent.objects.filter(
+                    pk__in=locked).delete()[0]
+
+        self.stdout.write("Deleted %d saved emails and %d bodies."
+                          % (deleted, deleted_bodies))
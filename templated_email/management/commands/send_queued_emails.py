@@ -0,0 +1,101 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from templated_email.connection_pool import (
+    create_connection_pool, get_connection_pool)
+from templated_email.models import QueuedEmail
+
+
+class Command(BaseCommand):
+    help = ("Send the emails queued in the outbox, in batches. Several "
+            "workers may run at the same time.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=100,
+            help="How many emails are claimed and sent at a time.")
+        parser.add_argument(
+            '--max-attempts', type=int,
+            default=getattr(settings, 'TEMPLATED_EMAIL_QUEUE_MAX_ATTEMPTS', 5),
+            help="How many times an email is tried before it's marked as "
+                 "failed. Defaults to the TEMPLATED_EMAIL_QUEUE_MAX_ATTEMPTS "
+                 "setting.")
+        parser.add_argument(
+            '--retry-delay', type=int,
+            default=getattr(settings, 'TEMPLATED_EMAIL_QUEUE_RETRY_DELAY', 60),
+            help="Seconds to wait before the first retry, doubled for each "
+                 "of the following ones. Defaults to the "
+                 "TEMPLATED_EMAIL_QUEUE_RETRY_DELAY setting.")
+        parser.add_argument(
+            '--loop', action='store_true',
+            help="Keep waiting for new emails instead of exiting once the "
+                 "outbox is empty.")
+        parser.add_argument(
+            '--sleep', type=float, default=5,
+            help="Seconds to wait for new emails when the outbox is empty, "
+                 "with --loop.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError("--batch-size must be a positive number.")
+
+        pool = get_connection_pool()
+        own_pool = pool is None
+        if own_pool:
+            pool = create_connection_pool()
+
+        total_sent = total_failed = 0
+        try:
+            while True:
+                sent, failed = self.send_batch(pool, batch_size,
+                                               options['max_attempts'],
+                                               options['retry_delay'])
+                total_sent += sent
+                total_failed += failed
+                if sent or failed:
+                    continue
+                if not options['loop']:
+                    break
+                time.sleep(options['sleep'])
+        finally:
+            if own_pool:
+                pool.close()
+
+        self.stdout.write("Sent %d queued emails, %d attempts failed."
+                          % (total_sent, total_failed))
+
+    def send_batch(self, pool, batch_size, max_attempts, retry_delay):
+        """
+        Claim up to ``batch_size`` due emails and send them, returning how
+        many were sent and how many failed.
+
+        Claimed rows stay locked until the batch is done, so other workers
+        skip them. Should the worker die, they are sent again by another.
+        """
+        sent_pks = []
+        failed = []
+        with transaction.atomic():
+            queued_emails = list(
+                QueuedEmail.objects.select_for_update(skip_locked=True)
+                .filter(status=QueuedEmail.QUEUED,
+                        next_attempt_at__lte=timezone.now())
+                .order_by('next_attempt_at', 'pk')[:batch_size])
+            for queued_email in queued_emails:
+                try:
+                    pool.send_messages([queued_email.message])
+                except Exception as error:
+                    queued_email.retry_later(error, max_attempts, retry_delay)
+                    failed.append(queued_email)
+                else:
+                    sent_pks.append(queued_email.pk)
+            if sent_pks:
+                QueuedEmail.objects.filter(pk__in=sent_pks).delete()
+            if failed:
+                QueuedEmail.objects.bulk_update(
+                    failed, ['status', 'attempts', 'next_attempt_at', 'last_error'])
+        return len(sent_pks), len(failed)
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from templated_email import get_connection
+
+
+class Command(BaseCommand):
+    help = ("Load every email template found by the template loaders and "
+            "index its blocks, so the first emails sent don't pay for it.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'template_names', nargs='*',
+            help="Only warm these templates. Defaults to every template "
+                 "under TEMPLATED_EMAIL_TEMPLATE_DIR.")
+        parser.add_argument(
+            '--template-dir',
+            help="The directory holding the templates. Defaults to the "
+                 "TEMPLATED_EMAIL_TEMPLATE_DIR setting.")
+        parser.add_argument(
+            '--file-extension',
+            help="The extension of the templates. Defaults to the "
+                 "TEMPLATED_EMAIL_FILE_EXTENSION setting.")
+
+    def handle(self, *args, **options):
+        backend = get_connection()
+        results = backend.warm_templates(options['template_names'] or None,
+                                         template_dir=options['template_dir'],
+                                         file_extension=options['file_extension'])
+        failed = 0
+        total = 0
+        for template_name, seconds, error in results:
+            total += seconds
+            if error is not None:
+                failed += 1
+                self.stderr.write("%s: %s: %s" % (template_name,
+                                                  type(error).__name__, error))
+            else:
+                self.stdout.write("%s: %.1f ms" % (template_name, seconds * 1000))
+
+        self.stdout.write("Warmed %d templates in %.1f ms."
+                          % (len(results) - failed, total * 1000))
+        if failed:
+            raise CommandError("Couldn't warm %d templates." % failed)
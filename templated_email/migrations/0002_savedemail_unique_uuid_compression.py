@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:07
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('templated_email', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='savedemail',
+            name='compressed_content',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='savedemail',
+            name='compression',
+            field=models.CharField(blank=True, max_length=8),
+        ),
+        migrations.AlterField(
+            model_name='savedemail',
+            name='content',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AlterField(
+            model_name='savedemail',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='savedemail',
+            name='uuid',
+            field=models.UUIDField(default=uuid.uuid4, unique=True),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('templated_email', '0002_savedemail_unique_uuid_compression'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SavedEmailContent',
+            fields=[
+                ('content', models.TextField(blank=True)),
+                ('compressed_content', models.BinaryField(blank=True, null=True)),
+                ('compression', models.CharField(blank=True, max_length=8)),
+                ('digest', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.AddField(
+            model_name='savedemail',
+            name='body',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='saved_emails', to='templated_email.savedemailcontent'),
+        ),
+    ]
@@ -0,0 +1,82 @@
+import hashlib
+import zlib
+
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+
+def decompress(data, compression):
+    # A copy of templated_email.models.decompress as of this migration.
+    if compression == 'zlib':
+        return zlib.decompress(data)
+    if compression == 'zstd':
+        import zstandard
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise ValueError("Unknown compression %r" % (compression, ))
+
+
+def move_content_to_body(apps, schema_editor):
+    SavedEmail = apps.get_model('templated_email', 'SavedEmail')
+    SavedEmailContent = apps.get_model('templated_email', 'SavedEmailContent')
+
+    legacy = SavedEmail.objects.filter(body__isnull=True).order_by('pk')
+    while True:
+        saved_emails = list(legacy[:BATCH_SIZE])
+        if not saved_emails:
+            break
+
+        bodies = {}
+        for saved_email in saved_emails:
+            if saved_email.compression:
+                html = decompress(bytes(saved_email.compressed_content),
+                                  saved_email.compression).decode('utf-8')
+            else:
+                html = saved_email.content
+            digest = hashlib.sha256(html.encode('utf-8')).hexdigest()
+            # The body keeps the content as it was stored, compressed or not.
+            bodies.setdefault(digest, SavedEmailContent(
+                digest=digest, content=saved_email.content,
+                compressed_content=saved_email.compressed_content,
+                compression=saved_email.compression))
+            saved_email.body_id = digest
+            saved_email.content = ''
+            saved_email.compressed_content = None
+            saved_email.compression = ''
+
+        existing = set(SavedEmailContent.objects.filter(
+            pk__in=list(bodies)).values_list('pk', flat=True))
+        SavedEmailContent.objects.bulk_create(
+            [body for digest, body in bodies.items() if digest not in existing])
+        SavedEmail.objects.bulk_update(
+            saved_emails,
+            ['body', 'content', 'compressed_content', 'compression'])
+
+
+def move_body_to_content(apps, schema_editor):
+    SavedEmail = apps.get_model('templated_email', 'SavedEmail')
+
+    linked = SavedEmail.objects.filter(body__isnull=False).select_related('body').order_by('pk')
+    while True:
+        saved_emails = list(linked[:BATCH_SIZE])
+        if not saved_emails:
+            break
+        for saved_email in saved_emails:
+            saved_email.content = saved_email.body.content
+            saved_email.compressed_content = saved_email.body.compressed_content
+            saved_email.compression = saved_email.body.compression
+            saved_email.body = None
+        SavedEmail.objects.bulk_update(
+            saved_emails,
+            ['body', 'content', 'compressed_content', 'compression'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('templated_email', '0003_savedemailcontent'),
+    ]
+
+    operations = [
+        migrations.RunPython(move_content_to_body, move_body_to_content),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:33
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('templated_email', '0005_queuedemail'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='savedemail',
+            name='compressed_content',
+        ),
+        migrations.RemoveField(
+            model_name='savedemail',
+            name='compression',
+        ),
+        migrations.RemoveField(
+            model_name='savedemail',
+            name='content',
+        ),
+    ]
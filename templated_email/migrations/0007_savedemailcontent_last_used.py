@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:33
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('templated_email', '0006_savedemail_remove_content'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='savedemailcontent',
+            name='last_used',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -1,9 +1,230 @@
+import hashlib
+import pickle
+import warnings
+import zlib
+from datetime import timedelta
 from uuid import uuid4
 
-from django.db import models
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError, models, transaction
+from django.utils import timezone
+
+from templated_email.utils import get_message_id
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def compress(data, compression):
+    if compression == 'zlib':
+        return zlib.compress(data)
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ImproperlyConfigured(
+                "The 'zstd' compression requires the zstandard package")
+        return zstandard.ZstdCompressor().compress(data)
+    raise ImproperlyConfigured(
+        "TEMPLATED_EMAIL_SAVED_EMAIL_COMPRESSION must be None, 'zlib' or "
+        "'zstd', got %r" % (compression, ))
+
+
+def decompress(data, compression):
+    if compression == 'zlib':
+        return zlib.decompress(data)
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ImproperlyConfigured(
+                "The 'zstd' compression requires the zstandard package")
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise ValueError("Unknown compression %r" % (compression, ))
+
+
+class CompressedHtmlModel(models.Model):
+    """
+    Abstract model storing an HTML document, compressed according to the
+    TEMPLATED_EMAIL_SAVED_EMAIL_COMPRESSION setting.
+    """
+    content = models.TextField(blank=True)
+    compressed_content = models.BinaryField(null=True, blank=True)
+    compression = models.CharField(max_length=8, blank=True)
+
+    class Meta:
+        abstract = True
+
+    @property
+    def html(self):
+        if self.compression:
+            return decompress(bytes(self.compressed_content),
+                              self.compression).decode('utf-8')
+        return self.content
+
+    @html.setter
+    def html(self, value):
+        compression = getattr(settings, 'TEMPLATED_EMAIL_SAVED_EMAIL_COMPRESSION', None)
+        if compression:
+            self.compressed_content = compress(value.encode('utf-8'), compression)
+            self.compression = compression
+            self.content = ''
+        else:
+            self.compressed_content = None
+            self.compression = ''
+            self.content = value
+
+
+class SavedEmailContent(CompressedHtmlModel):
+    """
+    An HTML body shared by every SavedEmail with the same content, keyed by
+    its SHA-256 digest.
+
+    ``last_used`` is bumped whenever an email is saved with it, so
+    prune_saved_emails leaves alone the bodies a send may be about to use.
+    """
+    digest = models.CharField(max_length=64, primary_key=True)
+    created = models.DateTimeField(auto_now_add=True)
+    last_used = models.DateTimeField(default=timezone.now)
+
+    @classmethod
+    def from_html(cls, html):
+        """Return an unsaved SavedEmailContent for ``html``."""
+        body = cls(digest=hashlib.sha256(html.encode('utf-8')).hexdigest())
+        body.html = html
+        return body
+
+
+def _save_bodies(saved_emails, batch_size=None):
+    bodies = {}
+    now = timezone.now()
+    for saved_email in saved_emails:
+        body = saved_email.body
+        if body is not None and body._state.adding:
+            body.last_used = now
+            bodies[body.digest] = body
+    if bodies:
+        # Identical bodies may already be stored: mark them as used first, so
+        # prune_saved_emails keeps them, and only write the missing ones.
+        stored = SavedEmailContent.objects.filter(pk__in=list(bodies))
+        stored.update(last_used=now)
+        existing = set(stored.values_list('pk', flat=True))
+        missing = [body for digest, body in bodies.items() if digest not in existing]
+        try:
+            with transaction.atomic():
+                SavedEmailContent.objects.bulk_create(missing, batch_size=batch_size)
+        except IntegrityError:
+            # Another send wrote some of them meanwhile.
+            for body in missing:
+                try:
+                    with transaction.atomic():
+                        body.save(force_insert=True)
+                except IntegrityError:
+                    SavedEmailContent.objects.filter(pk=body.pk).update(last_used=now)
+        for body in bodies.values():
+            body._state.adding = False
+
+
+class SavedEmailQuerySet(models.QuerySet):
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        _save_bodies(objs, kwargs.get('batch_size'))
+        return super(SavedEmailQuerySet, self).bulk_create(objs, *args, **kwargs)
 
 
 class SavedEmail(models.Model):
-    uuid = models.UUIDField(default=uuid4)
-    content = models.TextField()
+    uuid = models.UUIDField(default=uuid4, unique=True)
+    body = models.ForeignKey(SavedEmailContent, null=True, blank=True,
+                             on_delete=models.PROTECT,
+                             related_name='saved_emails')
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    objects = SavedEmailQuerySet.as_manager()
+
+    @property
+    def html(self):
+        """
+        The saved HTML. Assigning it points the email to the
+        SavedEmailContent of that HTML, written along with the email.
+        """
+        if self.body_id is None:
+            return ''
+        return self.body.html
+
+    @html.setter
+    def html(self, value):
+        self.body = SavedEmailContent.from_html(value)
+
+    @property
+    def content(self):
+        """Deprecated alias of html, the HTML is stored by SavedEmailContent."""
+        warnings.warn('SavedEmail.content is deprecated, use SavedEmail.html',
+                      DeprecationWarning, stacklevel=2)
+        return self.html
+
+    @content.setter
+    def content(self, value):
+        warnings.warn('SavedEmail.content is deprecated, use SavedEmail.html',
+                      DeprecationWarning, stacklevel=2)
+        self.html = value
+
+    def save(self, *args, **kwargs):
+        _save_bodies([self])
+        super(SavedEmail, self).save(*args, **kwargs)
+
+
+class QueuedEmail(models.Model):
+    """
+    A rendered email waiting in the outbox for the send_queued_emails
+    command, which deletes it once it's sent.
+    """
+    QUEUED = 'queued'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (QUEUED, 'Queued'),
+        (FAILED, 'Failed'),
+    )
+
+    message_data = models.BinaryField()
+    message_id = models.CharField(max_length=255, blank=True)
+    status = models.CharField(max_length=8, choices=STATUS_CHOICES,
+                              default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
     created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'],
+                         name='templated_e_status_next_idx'),
+        ]
+
+    @property
+    def message(self):
+        """The queued EmailMessage, without a connection."""
+        return pickle.loads(bytes(self.message_data))
+
+    @message.setter
+    def message(self, value):
+        connection = value.connection
+        value.connection = None
+        try:
+            self.message_data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        finally:
+            value.connection = connection
+        self.message_id = get_message_id(value.extra_headers) or ''
+
+    def retry_later(self, error, max_attempts, retry_delay):
+        """
+        Record a failed attempt to send the email, and either schedule the
+        next one, waiting twice as long as the previous, or give up after
+        ``max_attempts``.
+        """
+        self.attempts += 1
+        self.last_error = repr(error)
+        if self.attempts >= max_attempts:
+            self.status = self.FAILED
+        else:
+            self.next_attempt_at = timezone.now() + timedelta(
+                seconds=retry_delay * 2 ** (self.attempts - 1))
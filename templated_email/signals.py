@@ -0,0 +1,30 @@
+import time
+
+from django.dispatch import Signal
+
+
+# Sent by TemplateBackend after each stage of building and sending an email,
+# with the name of the ``stage``, the ``template_name`` it was for and its
+# ``duration`` in seconds. The 'render' stage is sent for every rendered
+# block, with its name as ``part``. The stages are 'resolve', 'render',
+# 'plain', 'attach_images', 'save_email', 'send' and 'queue'.
+email_stage_timed = Signal()
+
+
+def stage_started(sender):
+    """
+    Return the time a stage starts at, or None when nothing receives
+    email_stage_timed from ``sender``, so untimed stages cost a single check.
+    """
+    if email_stage_timed.has_listeners(sender):
+        return time.perf_counter()
+    return None
+
+
+def stage_finished(sender, started, stage, template_name, **kwargs):
+    """Send email_stage_timed for a stage begun by stage_started."""
+    if started is not None:
+        email_stage_timed.send(sender=sender, stage=stage,
+                               template_name=template_name,
+                               duration=time.perf_counter() - started,
+                               **kwargs)
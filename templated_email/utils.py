@@ -1,16 +1,46 @@
+import base64
+import io
+import mmap
+import os
+import re
+import hashlib
+import inspect
+import threading
+from collections import ChainMap, OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
 from functools import partial
 from email.utils import unquote
+from html.parser import HTMLParser
 from email.mime.image import MIMEImage
 
 from django.core.mail import make_msgid
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.functional import LazyObject, empty
 from django.utils.module_loading import import_string
 from django.conf import settings
 
 
+# Classes imported by _get_klass_from_config, by setting and dotted path.
+_klasses = {}
+
+
+@receiver(setting_changed, dispatch_uid='templated_email_klass_setting_changed')
+def _clear_klasses(sender, setting, **kwargs):
+    if setting in ('TEMPLATED_EMAIL_EMAIL_MESSAGE_CLASS',
+                   'TEMPLATED_EMAIL_EMAIL_MULTIALTERNATIVES_CLASS'):
+        _klasses.clear()
+
+
 def _get_klass_from_config(config_variable, default):
     klass_path = getattr(settings, config_variable, default)
     if isinstance(klass_path, str):
-        klass_path = import_string(klass_path)
+        key = (config_variable, klass_path)
+        klass = _klasses.get(key)
+        if klass is None:
+            klass = _klasses[key] = import_string(klass_path)
+        klass_path = klass
 
     return klass_path
 
@@ -28,28 +58,446 @@ get_emailmultialternatives_klass = partial(
 )
 
 
+def get_message_id(headers):
+    """
+    Return the Message-Id of ``headers``, whatever the case of its name, or
+    None.
+    """
+    for name, value in headers.items():
+        if name.lower() == 'message-id':
+            return value
+    return None
+
+
+class LRUCache(object):
+    """
+    A thread-safe mapping holding at most ``maxsize`` entries, evicting the
+    least recently used ones first.
+
+    ``maxsize`` may also be a callable, which is evaluated on every insertion
+    so the limit can come from settings that are not configured yet when the
+    cache is created. A size of 0 disables the cache.
+    """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_maxsize(self):
+        return self.maxsize() if callable(self.maxsize) else self.maxsize
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return default
+            return self._data[key]
+
+    def set(self, key, value):
+        maxsize = self._get_maxsize()
+        with self._lock:
+            if maxsize <= 0:
+                return
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+
+class _PlainTextParser(HTMLParser):
+    paragraph_tags = frozenset([
+        'blockquote', 'dl', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'hr', 'ol',
+        'p', 'pre', 'table', 'ul',
+    ])
+    line_tags = frozenset([
+        'address', 'article', 'aside', 'dd', 'div', 'dt', 'footer', 'form',
+        'header', 'li', 'section', 'tr',
+    ])
+    ignored_tags = frozenset(['head', 'script', 'style', 'title'])
+    cell_tags = frozenset(['td', 'th'])
+    whitespace_re = re.compile(r'\s+')
+
+    def __init__(self):
+        super(_PlainTextParser, self).__init__(convert_charrefs=True)
+        self.chunks = []
+        self.links = []
+        self.ignoring = 0
+        self.pre = 0
+        self.pending = 0
+        self.prefix = ''
+        self.cells = 0
+        self.separator = ''
+
+    def block(self, count, prefix=''):
+        self.pending = max(self.pending, count)
+        self.prefix = prefix
+
+    def write(self, text):
+        if self.pending:
+            if self.chunks:
+                self.chunks.append('\n' * self.pending)
+            text = self.prefix + (text if self.pre else text.lstrip(' '))
+            self.pending = 0
+            self.prefix = ''
+            self.separator = ''
+        elif self.separator:
+            if self.chunks:
+                self.chunks[-1] = self.chunks[-1].rstrip(' ')
+            text = self.separator + text.lstrip(' ')
+            self.separator = ''
+        self.chunks.append(text)
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.ignored_tags:
+            self.ignoring += 1
+        elif tag == 'br':
+            self.chunks.append('\n')
+        elif tag in self.paragraph_tags:
+            self.block(2)
+            if tag == 'pre':
+                self.pre += 1
+        elif tag == 'li':
+            self.block(1, '* ')
+        elif tag == 'dd':
+            self.block(1, '    ')
+        elif tag in self.line_tags:
+            self.block(1)
+            if tag == 'tr':
+                self.cells = 0
+        elif tag in self.cell_tags:
+            # Cells of a row are separated by tabs.
+            if self.cells:
+                self.separator = '\t'
+            self.cells += 1
+        elif tag == 'a':
+            self.links.append((dict(attrs).get('href'), len(self.chunks)))
+        elif tag == 'img':
+            alt = dict(attrs).get('alt')
+            if alt:
+                self.write(alt)
+
+    def handle_endtag(self, tag):
+        if tag in self.ignored_tags:
+            self.ignoring = max(self.ignoring - 1, 0)
+        elif tag in self.paragraph_tags:
+            self.block(2)
+            if tag == 'pre':
+                self.pre = max(self.pre - 1, 0)
+        elif tag in self.line_tags:
+            self.block(1)
+        elif tag == 'a' and self.links:
+            href, start = self.links.pop()
+            text = ''.join(self.chunks[start:]).strip()
+            if href and not href.startswith(('#', 'cid:', 'mailto:')) and href != text:
+                self.write(' (%s)' % href)
+
+    def handle_data(self, data):
+        if self.ignoring:
+            return
+        if not self.pre:
+            data = self.whitespace_re.sub(' ', data)
+            if self.pending and not data.strip():
+                return
+        self.write(data)
+
+    def get_text(self):
+        lines = ''.join(self.chunks).split('\n')
+        return '\n'.join(line.rstrip() for line in lines).strip('\n') + '\n'
+
+
+def html_to_text(html):
+    """
+    Convert an HTML document to plain text with the standard library parser.
+
+    A lot faster than html2text, at the price of a simpler output: block
+    elements become line breaks, list items are bulleted, table cells are
+    separated by tabs and links are followed by their URL.
+    """
+    parser = _PlainTextParser()
+    parser.feed(html)
+    parser.close()
+    return parser.get_text()
+
+
+_unset = object()
+
+
+class LazyValue(object):
+    """
+    A callable context value, called the first time a template uses it and
+    returning that same result afterwards.
+    """
+    __slots__ = ('func', 'value')
+
+    def __init__(self, func):
+        self.func = func
+        self.value = _unset
+
+    def __call__(self):
+        if self.value is _unset:
+            self.value = self.func()
+        return self.value
+
+    @property
+    def evaluated(self):
+        return self.value is not _unset
+
+
+def lazy_context(context):
+    """
+    Return an overlay of ``context`` in which the callables templates would
+    call, e.g. a function returning an expensive QuerySet, are only called
+    once, whichever blocks use them. The context itself isn't copied.
+    """
+    lazy_values = {
+        key: LazyValue(value) for key, value in context.items()
+        if callable(value) and not isinstance(value, (type, LazyValue))
+        and not getattr(value, 'do_not_call_in_templates', False)
+        and not getattr(value, 'alters_data', False)
+        and _takes_no_arguments(value)}
+    return ChainMap(lazy_values, context)
+
+
+def _takes_no_arguments(func):
+    # Templates render callables needing arguments as string_if_invalid,
+    # which they tell from the signature: a LazyValue would hide it.
+    try:
+        inspect.signature(func).bind()
+    except (TypeError, ValueError):
+        return False
+    return True
+
+
+def get_evaluated_value(value):
+    """
+    Return ``value``, or what it evaluated to when it's a LazyValue or a
+    SimpleLazyObject. Lazy values that weren't evaluated give None, they
+    stay unevaluated.
+    """
+    # isinstance() would evaluate lazy objects through their __class__.
+    value_type = type(value)
+    if issubclass(value_type, LazyValue):
+        return value.value if value.evaluated else None
+    if issubclass(value_type, LazyObject):
+        return None if value._wrapped is empty else value._wrapped
+    return value
+
+
+_inline_image_resolver = ContextVar('templated_email_inline_image_resolver',
+                                    default=None)
+
+
+@contextmanager
+def resolve_inline_images(resolver):
+    """
+    Within this block InlineImages render as ``resolver(image)`` instead of
+    their Content-ID, e.g. to point them to a hosted copy.
+    """
+    token = _inline_image_resolver.set(resolver)
+    try:
+        yield
+    finally:
+        _inline_image_resolver.reset(token)
+
+
+_inline_image_registry = ContextVar('templated_email_inline_image_registry',
+                                    default=None)
+
+
+@contextmanager
+def record_inline_images():
+    """
+    Within this block the InlineImages rendered as their Content-ID are
+    recorded in the dict it yields, in the order they are first used. They
+    are also recorded by the enclosing block, if any.
+    """
+    outer = _inline_image_registry.get()
+    images = {}
+    token = _inline_image_registry.set(images)
+    try:
+        yield images
+    finally:
+        _inline_image_registry.reset(token)
+        if outer is not None:
+            outer.update(images)
+
+
+def register_inline_image(image):
+    """Record ``image`` as used, within a record_inline_images block."""
+    images = _inline_image_registry.get()
+    if images is not None:
+        images[image] = None
+
+
 class InlineImage(object):
+    """
+    An image attached to the message and referenced by its Content-ID.
+
+    ``content`` holds the image bytes. The from_path(), from_file() and
+    from_storage() constructors instead read them from a file whenever they
+    are needed, memory-mapped when it's on disk, so only the base64 encoded
+    payload stays in memory, shared by every message the image is attached
+    to.
+    """
+    __slots__ = ('filename', 'domain', '_content', '_source', '_subtype',
+                 '_content_id', '_mime_payload', '_md5', '__weakref__')
 
     def __init__(self, filename, content, subtype=None, domain=None):
         self.filename = filename
         self._content = content
-        self.subtype = subtype
+        self._source = None
+        self._subtype = subtype
         self.domain = domain
         self._content_id = None
+        self._mime_payload = None
+        self._md5 = None
+
+    @classmethod
+    def _from_source(cls, source, filename, subtype, domain):
+        image = cls(filename, None, subtype, domain)
+        image._source = source
+        return image
+
+    @classmethod
+    def from_path(cls, path, filename=None, subtype=None, domain=None):
+        """Return an image read from the file at ``path`` when needed."""
+        return cls._from_source(('path', path),
+                                filename or os.path.basename(path),
+                                subtype, domain)
+
+    @classmethod
+    def from_file(cls, file, filename=None, subtype=None, domain=None):
+        """
+        Return an image read from ``file``, a django File or FieldFile, e.g.
+        the value of an ImageField, which is reopened when needed.
+        """
+        return cls._from_source(('file', file),
+                                filename or os.path.basename(file.name),
+                                subtype, domain)
+
+    @classmethod
+    def from_storage(cls, name, storage=None, filename=None, subtype=None,
+                     domain=None):
+        """
+        Return an image read from the file ``name`` of ``storage``, the
+        default storage unless given, when needed.
+        """
+        return cls._from_source(('storage', name, storage),
+                                filename or os.path.basename(name),
+                                subtype, domain)
+
+    def open(self):
+        """Return a binary file object reading the content."""
+        if self._source is None:
+            return io.BytesIO(self._content)
+        kind = self._source[0]
+        if kind == 'path':
+            return open(self._source[1], 'rb')
+        if kind == 'file':
+            return self._source[1].open('rb')
+        storage = self._source[2]
+        if storage is None:
+            from django.core.files.storage import default_storage as storage
+        return storage.open(self._source[1], 'rb')
+
+    @contextmanager
+    def _open_content(self):
+        """
+        Yield the content as a bytes-like object, memory-mapped when it's
+        read from a file on disk.
+        """
+        if self._source is None:
+            yield self._content
+            return
+        with self.open() as image_file:
+            try:
+                mapped = mmap.mmap(image_file.fileno(), 0,
+                                   access=mmap.ACCESS_READ)
+            except (AttributeError, OSError, ValueError,
+                    io.UnsupportedOperation):
+                # In memory or empty files can't be mapped.
+                mapped = None
+            if mapped is None:
+                yield image_file.read()
+            else:
+                with mapped:
+                    yield mapped
 
     @property
     def content(self):
-        return self._content
+        """
+        The image bytes. Those of file backed images are read on every
+        access, not kept.
+        """
+        if self._source is None:
+            return self._content
+        with self._open_content() as content:
+            return bytes(content)
 
     @content.setter
     def content(self, value):
         self._content_id = None
+        self._mime_payload = None
+        self._md5 = None
         self._content = value
+        self._source = None
+
+    @property
+    def md5(self):
+        """The hex MD5 digest of the content, computed once."""
+        if self._md5 is None:
+            with self._open_content() as content:
+                self._md5 = hashlib.md5(content).hexdigest()
+        return self._md5
+
+    @property
+    def subtype(self):
+        return self._subtype
+
+    @subtype.setter
+    def subtype(self, value):
+        self._mime_payload = None
+        self._subtype = value
+
+    def get_mime_payload(self):
+        """
+        Return the image subtype and its base64 encoded content, computed
+        once and shared by every message the image is attached to.
+        """
+        if self._mime_payload is None:
+            with self._open_content() as content:
+                if isinstance(content, mmap.mmap):
+                    # MIMEImage only takes bytes, guess the subtype from the
+                    # header and encode the mapped file the way it would.
+                    subtype = MIMEImage(content[:32], self.subtype).get_content_subtype()
+                    payload = str(base64.encodebytes(content), 'ascii')
+                else:
+                    image = MIMEImage(content, self.subtype)
+                    subtype, payload = image.get_content_subtype(), image.get_payload()
+            self._mime_payload = (subtype, payload)
+        return self._mime_payload
 
     def attach_to_message(self, message):
         if not self._content_id:
             self.generate_cid()
-        image = MIMEImage(self.content, self.subtype)
+        subtype, payload = self.get_mime_payload()
+        # Only the headers are built for each message, the payload is
+        # already encoded.
+        image = MIMEImage(b'', subtype, _encoder=_noop_encoder)
+        image.set_payload(payload)
+        image['Content-Transfer-Encoding'] = 'base64'
         image.add_header('Content-Disposition', 'inline', filename=self.filename)
         image.add_header('Content-ID', self._content_id)
         message.attach(image)
@@ -58,6 +506,14 @@ class InlineImage(object):
         self._content_id = make_msgid('img', self.domain)
 
     def __str__(self):
+        resolver = _inline_image_resolver.get()
+        if resolver is not None:
+            return resolver(self)
+        register_inline_image(self)
         if not self._content_id:
             self.generate_cid()
         return 'cid:' + unquote(self._content_id)
+
+
+def _noop_encoder(message):
+    pass
@@ -4,7 +4,7 @@ from templated_email.models import SavedEmail
 
 
 class ShowEmailView(DetailView):
-    model = SavedEmail
+    queryset = SavedEmail.objects.select_related('body')
     template_name = 'templated_email/saved_email.html'
     slug_field = 'uuid'
     slug_url_kwarg = 'uuid'
@@ -1,4 +1,7 @@
 import base64
+import hashlib
+from smtplib import SMTPException, SMTPServerDisconnected
+from pathlib import Path
 from io import BytesIO
 from datetime import date
 from email.mime.image import MIMEImage
@@ -13,16 +16,25 @@ except ImportError:
     def get_storage_class(s):
         storages[s]
 
-from django.template import TemplateDoesNotExist
+from django.template import TemplateDoesNotExist, loader
+from django.utils import translation
+from django.utils.functional import SimpleLazyObject
+from django.utils.autoreload import file_changed
 from django.core import mail
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
 
 import pytest
 from unittest.mock import patch, Mock
 from anymail.message import AnymailMessage
+from render_block import BlockNotFound
 
-from templated_email.backends.vanilla_django import TemplateBackend, EmailRenderException
+from templated_email.backends.vanilla_django import (
+    TemplateBackend, EmailRenderException, SubjectTemplate,
+    get_subject_template, _hosted_image_urls, _template_cache)
 from templated_email import InlineImage
-from templated_email.models import SavedEmail
+from templated_email.utils import html_to_text
+from templated_email.models import QueuedEmail, SavedEmail
 from .utils import TempalteBackendBaseMixin
 from tests.utils import MockedNetworkTestCaseMixin
 
@@ -76,6 +88,8 @@ class TemplateBackendTestCase(MockedNetworkTestCaseMixin,
     template_backend_klass = TemplateBackend
 
     def setUp(self):
+        _template_cache.clear()
+        _hosted_image_urls.clear()
         self.backend = self.template_backend_klass()
         self.context = {'username': 'vintasoftware',
                         'joindate': date(2016, 8, 22),
@@ -123,6 +137,155 @@ class TemplateBackendTestCase(MockedNetworkTestCaseMixin,
         self.assertEqual(PLAIN_RESULT, response['plain'])
         self.assertEqual('Another subject for vintasoftware', response['subject'])
 
+    def test_render_email_resolves_template_once(self):
+        with patch('templated_email.backends.vanilla_django.loader.select_template',
+                   wraps=loader.select_template) as select_template:
+            response = self.backend._render_email(
+                'inheritance_template.email', self.context)
+            self.backend._render_email(
+                'inheritance_template.email', self.context)
+        select_template.assert_called_once_with(
+            ['templated_email/inheritance_template.email'])
+        self.assertEqual(len(response.keys()), 3)
+
+    def test_render_blocks_reports_missing_blocks(self):
+        compiled = self.backend._get_compiled_template('plain_template.email')
+        response, errors = self.backend._render_blocks(
+            compiled, ['subject', 'html', 'plain'], self.context)
+        self.assertEqual(set(response), {'subject', 'plain'})
+        self.assertEqual(set(errors), {'html'})
+        self.assertTrue(isinstance(errors['html'], BlockNotFound))
+        self.assertEqual(compiled.parts, {'subject', 'plain'})
+
+    def test_compiled_template_indexes_inherited_blocks(self):
+        compiled = self.backend._get_compiled_template('inheritance_template')
+        self.backend._render_blocks(compiled, ['subject'], self.context)
+        self.assertEqual(compiled.parts, {'subject', 'html', 'plain'})
+        self.assertEqual(len(compiled.blocks), 2)
+
+    def test_compiled_template_cache_cleared_on_template_change(self):
+        self.backend._get_compiled_template('plain_template.email')
+        self.assertEqual(len(_template_cache), 1)
+        file_changed.send(sender=None, file_path=Path('plain_template.email'))
+        self.assertEqual(len(_template_cache), 0)
+
+    def test_find_templates(self):
+        self.assertEqual(self.backend.find_templates(), [
+            'html_template', 'inexistent_base', 'inheritance_template',
+            'inline_image', 'inline_images', 'mixed_template',
+            'multi-template', 'plain_template', 'plain_template_without_subject', 'welcome'])
+        self.assertEqual(self.backend.find_templates(file_extension='.txt'),
+                         ['legacy'])
+
+    def test_warm_template_indexes_blocks(self):
+        compiled = self.backend.warm_template('inheritance_template')
+        self.assertEqual(compiled.parts, {'subject', 'html', 'plain'})
+        self.assertIs(self.backend._get_compiled_template('inheritance_template'),
+                      compiled)
+
+    def test_warm_templates_reports_errors(self):
+        results = self.backend.warm_templates(['welcome', 'inexistent_base'])
+        self.assertEqual([result[0] for result in results],
+                         ['welcome', 'inexistent_base'])
+        self.assertIsNone(results[0][2])
+        self.assertTrue(isinstance(results[1][2], TemplateDoesNotExist))
+
+    @override_settings(TEMPLATED_EMAIL_TEMPLATE_CACHE_SIZE=1)
+    def test_compiled_template_cache_size(self):
+        self.backend._get_compiled_template('plain_template.email')
+        self.backend._get_compiled_template('html_template.email')
+        self.assertEqual(len(_template_cache), 1)
+
+    @override_settings(TEMPLATED_EMAIL_RENDER_CACHE_ALIAS='default')
+    def test_render_email_cache(self):
+        caches['default'].clear()
+        self.backend._render_email('mixed_template', self.context,
+                                   render_cache_key='digest')
+        self.context['username'] = 'other'
+        with patch.object(self.backend, '_render_blocks',
+                          wraps=self.backend._render_blocks) as render_blocks:
+            response = self.backend._render_email(
+                'mixed_template', self.context, render_cache_key='digest')
+        render_blocks.assert_not_called()
+        self.assertEqual(SUBJECT_RESULT, response['subject'])
+        self.assertEqual(PLAIN_RESULT, response['plain'])
+
+    @override_settings(TEMPLATED_EMAIL_RENDER_CACHE_ALIAS='default')
+    def test_render_email_cache_some_parts(self):
+        caches['default'].clear()
+        self.backend._render_email('mixed_template', self.context,
+                                   render_cache_key={'subject': 'digest'})
+        self.context['username'] = 'other'
+        response = self.backend._render_email(
+            'mixed_template', self.context,
+            render_cache_key={'subject': 'digest'})
+        self.assertEqual(SUBJECT_RESULT, response['subject'])
+        self.assertIn('username: other', response['plain'])
+
+    @override_settings(TEMPLATED_EMAIL_RENDER_CACHE_ALIAS='default')
+    def test_render_email_cache_automatic_key(self):
+        caches['default'].clear()
+        self.backend._render_email('mixed_template', self.context,
+                                   render_cache_key=True)
+        self.context['full_name'] = 'Other Name'
+        with patch.object(self.backend, '_render_blocks',
+                          wraps=self.backend._render_blocks) as render_blocks:
+            response = self.backend._render_email(
+                'mixed_template', self.context, render_cache_key=True)
+        # Only the html block uses full_name
+        self.assertEqual(render_blocks.call_args[0][1], ['html'])
+        self.assertEqual(SUBJECT_RESULT, response['subject'])
+        self.assertEqual(PLAIN_RESULT, response['plain'])
+        self.assertIn('Other Name', response['html'])
+
+        self.context['username'] = 'other'
+        response = self.backend._render_email(
+            'mixed_template', self.context, render_cache_key=True)
+        self.assertEqual('My subject for other', response['subject'])
+
+    def test_render_cache_automatic_key_skips_images(self):
+        compiled = self.backend._get_compiled_template('inline_images.email')
+        keys = self.backend._get_context_render_cache_keys(compiled, {
+            'images': [InlineImage('foo.png', b'foo', subtype='png')]})
+        self.assertEqual(set(keys), {'subject'})
+
+    def test_get_template_variables(self):
+        self.assertEqual(self.backend.get_template_variables('inheritance_template'), {
+            'subject': {'username'},
+            'html': {'username', 'full_name', 'joindate'},
+            'plain': {'username', 'joindate'},
+        })
+
+    def test_get_missing_variables(self):
+        self.assertEqual(self.backend.get_missing_variables('mixed_template',
+                                                            self.context), set())
+        self.assertEqual(self.backend.get_missing_variables(
+            'mixed_template', {'username': 'foo'}), {'full_name', 'joindate'})
+
+    @override_settings(TEMPLATED_EMAIL_PRUNE_CONTEXT=True)
+    def test_prune_context(self):
+        compiled = self.backend._get_compiled_template('mixed_template')
+        context = dict(self.context, unused='foo')
+        self.assertEqual(self.backend._get_part_context(compiled, 'subject', context),
+                         {'username': 'vintasoftware'})
+        response = self.backend._render_email('mixed_template', context)
+        self.assertEqual(SUBJECT_RESULT, response['subject'])
+        self.assertEqual(PLAIN_RESULT, response['plain'])
+        self.assertHTMLEqual(HTML_RESULT, response['html'])
+
+    def test_prune_context_disabled_by_default(self):
+        compiled = self.backend._get_compiled_template('mixed_template')
+        self.assertIs(self.backend._get_part_context(compiled, 'subject', self.context),
+                      self.context)
+
+    def test_render_email_cache_disabled_by_default(self):
+        self.backend._render_email('mixed_template', self.context,
+                                   render_cache_key='digest')
+        self.context['username'] = 'other'
+        response = self.backend._render_email(
+            'mixed_template', self.context, render_cache_key='digest')
+        self.assertEqual('My subject for other', response['subject'])
+
     def test_email_text_escaping(self):
         self.context['username'] = '<p>vintasoftware</p>'
 
@@ -152,7 +315,7 @@ class TemplateBackendTestCase(MockedNetworkTestCaseMixin,
     @patch.object(
         template_backend_klass, '_render_email',
         return_value={'html': HTML_RESULT, 'plain': PLAIN_RESULT,
-                      'subject': SUBJECT_RESULT}
+                      'subject': SUBJECT_RESULT, 'static_html': HTML_RESULT}
     )
     def test_get_email_message_with_create_link(self, mocked):
         self.backend.get_email_message(
@@ -160,32 +323,119 @@ class TemplateBackendTestCase(MockedNetworkTestCaseMixin,
             from_email='from@example.com', cc=['cc@example.com'],
             bcc=['bcc@example.com'], to=['to@example.com'],
             create_link=True)
-        first_call_context = mocked.call_args_list[0][0][1]
+        mocked.assert_called_once()
+        first_call_context = mocked.call_args[0][1]
         uuid = first_call_context['email_uuid']
         self.assertTrue(uuid)
-        second_call_context = mocked.call_args_list[1][0][1]
-        self.assertEqual(len(second_call_context), 0)
+        link_context = mocked.call_args[1]['link_context']
+        self.assertEqual(len(link_context), 0)
         saved_email = SavedEmail.objects.get(
             uuid=uuid)
-        self.assertEqual(saved_email.content, HTML_RESULT)
+        self.assertEqual(saved_email.html, HTML_RESULT)
 
-    @patch('django.core.files.storage.FileSystemStorage.save')
-    @patch('django.core.files.storage.FileSystemStorage.url')
+    def test_get_email_message_with_create_link_keeps_context(self):
+        context = dict(self.context)
+        self.backend.get_email_message('mixed_template', context,
+                                       to=['to@example.com'], create_link=True)
+        self.assertEqual(context, self.context)
+
+    def test_get_email_message_calls_lazy_values_once(self):
+        calls = []
+
+        def username():
+            calls.append('username')
+            return 'vintasoftware'
+
+        def unused():
+            calls.append('unused')
+
+        message = self.backend.get_email_message(
+            'mixed_template', dict(self.context, username=username,
+                                   unused=unused),
+            to=['to@example.com'], create_link=True)
+        self.assertEqual(calls, ['username'])
+        self.assertEqual(message.subject, SUBJECT_RESULT)
+        self.assertEqual(message.body, PLAIN_RESULT)
+
+    def test_get_email_message_skips_unused_lazy_objects(self):
+        unused = Mock()
+        message = self.backend.get_email_message(
+            'mixed_template', dict(self.context,
+                                   unused=SimpleLazyObject(unused)),
+            to=['to@example.com'])
+        unused.assert_not_called()
+        self.assertEqual(message.body, PLAIN_RESULT)
+
+    def test_get_email_message_attaches_evaluated_lazy_images(self):
+        inline_image = InlineImage('file.png', b'foo', subtype='png')
+        message = self.backend.get_email_message(
+            'inline_image.email',
+            {'image_file': SimpleLazyObject(lambda: inline_image),
+             'other_image': lambda: InlineImage('other.png', b'bar', subtype='png')},
+            to=['to@example.com'])
+        self.assertEqual(len(message.attachments), 1)
+        self.assertEqual(message.attachments[0]['Content-ID'],
+                         inline_image._content_id)
+
+    def test_get_email_message_attaches_used_images_only(self):
+        used = InlineImage('used.png', b'foo', subtype='png')
+        nested = InlineImage('nested.png', b'bar', subtype='png')
+        message = self.backend.get_email_message(
+            'inline_images.email',
+            {'images': [used, nested, used],
+             'unused': InlineImage('unused.png', b'baz', subtype='png')},
+            to=['to@example.com'])
+        self.assertEqual([a['Content-ID'] for a in message.attachments],
+                         [used._content_id, nested._content_id])
+
+    @override_settings(TEMPLATED_EMAIL_RENDER_CACHE_ALIAS='default')
+    def test_get_email_message_doesnt_cache_parts_with_images(self):
+        caches['default'].clear()
+        for name in ('first.png', 'second.png'):
+            inline_image = InlineImage(name, b'foo', subtype='png')
+            message = self.backend.get_email_message(
+                'inline_image.email', {'image_file': inline_image},
+                to=['to@example.com'], render_cache_key='digest')
+            self.assertIn(str(inline_image), message.alternatives[0][0])
+            self.assertEqual([a['Content-ID'] for a in message.attachments],
+                             [inline_image._content_id])
+        self.assertEqual(message.subject, 'With inline image')
+
+    @override_settings(TEMPLATED_EMAIL_DJANGO_SUBJECTS={'foo.email':
+                                                        'Hi %(username)s'})
     @patch.object(
         template_backend_klass, '_render_email',
-        return_value={'html': HTML_RESULT, 'plain': PLAIN_RESULT,
-                      'subject': SUBJECT_RESULT}
+        return_value={'plain': PLAIN_RESULT}
     )
-    def test_get_email_message_with_inline_image(self, mock_render_email, mock_url, mock_save):
+    def test_get_email_message_without_subject_lazy_value(self, mock):
+        message = self.backend.get_email_message('foo.email',
+                                                 {'username': lambda: 'bar'})
+        self.assertEqual(message.subject, 'Hi bar')
+
+    @patch('django.core.files.storage.FileSystemStorage.save')
+    @patch('django.core.files.storage.FileSystemStorage.url')
+    def test_get_email_message_with_inline_image(self, mock_url, mock_save):
         mock_url.return_value = 'media/saved_url'
-        self.backend.get_email_message(
-            'foo.email', {'an_image': InlineImage('file.png', b'foo',
-                                                    subtype='png')},
+        inline_image = InlineImage('file.png', b'foo', subtype='png')
+        message = self.backend.get_email_message(
+            'inline_image.email', {'image_file': inline_image},
             from_email='from@example.com', cc=['cc@example.com'],
             bcc=['bcc@example.com'], to=['to@example.com'],
             create_link=True)
-        second_call_context = mock_render_email.call_args_list[1][0][1]
-        self.assertEqual(second_call_context['an_image'], 'media/saved_url')
+        self.assertIn(str(inline_image), message.body)
+        saved_email = SavedEmail.objects.get()
+        self.assertHTMLEqual(saved_email.html, '<img src="media/saved_url">')
+        mock_save.assert_called_once()
+
+    def test_render_email_with_link_context_renders_html_only(self):
+        with patch.object(self.backend, '_render_blocks',
+                          wraps=self.backend._render_blocks) as render_blocks:
+            response = self.backend._render_email(
+                'mixed_template', dict(self.context, email_uuid='a_uuid'),
+                link_context=self.context)
+        self.assertEqual(render_blocks.call_count, 2)
+        self.assertEqual(render_blocks.call_args[0][1], ['html'])
+        self.assertHTMLEqual(HTML_RESULT, response['static_html'])
 
     @override_settings(TEMPLATED_EMAIL_EMAIL_MESSAGE_CLASS='anymail.message.AnymailMessage')
     @patch.object(
@@ -237,6 +487,54 @@ class TemplateBackendTestCase(MockedNetworkTestCaseMixin,
         self.assertEqual(message.bcc, ['bcc@example.com'])
         self.assertEqual(message.from_email, 'from@example.com')
 
+    @override_settings(TEMPLATED_EMAIL_DJANGO_SUBJECTS={'foo.email':
+                                                        'Hi %(username)s'})
+    @patch.object(
+        template_backend_klass, '_render_email',
+        return_value={'plain': PLAIN_RESULT}
+    )
+    def test_get_email_message_without_subject_missing_key(self, mock):
+        with self.assertRaisesMessage(EmailRenderException, 'username'):
+            self.backend.get_email_message('foo.email', {})
+        message = self.backend.get_email_message('foo.email', {'username': 'bar'})
+        self.assertEqual(message.subject, 'Hi bar')
+
+    def test_subject_template_keys(self):
+        subject_template = SubjectTemplate('%(a)s 100%% %%(b)s %(c)d')
+        self.assertEqual(subject_template.keys, {'a', 'c'})
+        self.assertEqual(subject_template.render({'a': 'x', 'c': 1}),
+                         'x 100% %(b)s 1')
+
+    @override_settings(TEMPLATED_EMAIL_DJANGO_SUBJECTS={'foo.email': 'foo'})
+    def test_subject_template_cached_per_language(self):
+        with translation.override('en'):
+            subject_template = get_subject_template(['bar.email', 'foo.email'])
+            self.assertIs(subject_template,
+                          get_subject_template(['bar.email', 'foo.email']))
+        with translation.override('pt-br'):
+            self.assertEqual(get_subject_template('bar.email').template,
+                             'bar.email email subject')
+        self.assertEqual(subject_template.template, 'foo')
+
+    @override_settings(TEMPLATED_EMAIL_DJANGO_SUBJECTS={'first': 'First',
+                                                        'last': 'Last'})
+    def test_subject_templates_never_read_partly_built(self):
+        subjects = []
+        building = []
+
+        def subject_template(subject):
+            # Another thread asking for a subject while they are built.
+            if subject == 'Last' and not building:
+                building.append(True)
+                subjects.append(get_subject_template('last').template)
+            return SubjectTemplate(subject)
+
+        with patch('templated_email.backends.vanilla_django.SubjectTemplate',
+                   side_effect=subject_template):
+            get_subject_template('first')
+        self.assertEqual(subjects, ['Last'])
+        self.assertEqual(get_subject_template('last').template, 'Last')
+
     @patch.object(
         template_backend_klass, '_render_email',
         return_value={'html': HTML_RESULT, 'subject': SUBJECT_RESULT}
@@ -265,6 +563,25 @@ class TemplateBackendTestCase(MockedNetworkTestCaseMixin,
         message = self.backend.get_email_message('foo.email', {})
         self.assertEqual(message.body, 'hi')
 
+    @patch.object(
+        template_backend_klass, '_render_email',
+        return_value={'html': HTML_RESULT, 'subject': SUBJECT_RESULT}
+    )
+    @override_settings(TEMPLATED_EMAIL_PLAIN_FUNCTION='html_parser')
+    def test_get_email_message_plain_function_alias(self, mock):
+        message = self.backend.get_email_message('foo.email', {})
+        self.assertEqual(message.body, html_to_text(HTML_RESULT))
+
+    def test_generate_plain_part_is_memoized(self):
+        plain_func = Mock(return_value='hi')
+        with override_settings(TEMPLATED_EMAIL_PLAIN_FUNCTION=plain_func):
+            for _ in range(3):
+                parts = {'html': HTML_RESULT}
+                self.backend._generate_plain_part(parts)
+                self.assertEqual(parts['plain'], 'hi')
+            self.backend._generate_plain_part({'html': HTML_RESULT + ' '})
+        self.assertEqual(plain_func.call_count, 2)
+
     def test_get_multi_match_last_email_message_generated_plain_text(self):
         message = self.backend.get_email_message(
             ['multi-template.email', 'foo.email', ], {},
@@ -386,6 +703,237 @@ class TemplateBackendTestCase(MockedNetworkTestCaseMixin,
         self.assertEqual(message.to, ['to@example.com', 'to2@example.com'])
         self.assertEqual(message.from_email, 'from@example.com')
 
+    def test_send_mass(self):
+        results = self.backend.send_mass(
+            'mixed_template', 'from@example.com',
+            [('to@example.com', {'username': 'foo'}),
+             (['to2@example.com'], {'username': 'bar'})])
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual([result.recipient_list for result in results],
+                         [['to@example.com'], ['to2@example.com']])
+        for result, message in zip(results, mail.outbox):
+            self.assertIsNone(result.error)
+            self.assertEqual(result.message_id, message.extra_headers['Message-Id'])
+        self.assertEqual(mail.outbox[0].subject, 'My subject for foo')
+        self.assertEqual(mail.outbox[1].subject, 'My subject for bar')
+
+    def test_send_mass_message_id_header_case(self):
+        results = self.backend.send_mass(
+            'mixed_template', 'from@example.com', [('to@example.com', {})],
+            headers={'Message-ID': '<a@example.com>'})
+        self.assertEqual(results[0].message_id, '<a@example.com>')
+        self.assertEqual(mail.outbox[0].message().get_all('Message-ID'),
+                         ['<a@example.com>'])
+
+    def test_send_mass_thread_pool(self):
+        recipients = [('to%d@example.com' % i, {'username': 'user%d' % i})
+                      for i in range(6)]
+        results = self.backend.send_mass(
+            'mixed_template', 'from@example.com', recipients,
+            render_workers=3, render_pool='thread')
+        self.assertEqual(len(mail.outbox), 6)
+        self.assertEqual([result.recipient_list for result in results],
+                         [[recipient] for recipient, _ in recipients])
+        subjects = {message.to[0]: message.subject for message in mail.outbox}
+        self.assertEqual(subjects['to4@example.com'], 'My subject for user4')
+
+    def test_send_mass_process_pool(self):
+        recipients = [('to%d@example.com' % i, {'username': 'user%d' % i})
+                      for i in range(3)]
+        results = self.backend.send_mass(
+            'mixed_template', 'from@example.com', recipients,
+            render_workers=2, render_pool='process')
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertTrue(all(result.message_id for result in results))
+        subjects = {message.to[0]: message.subject for message in mail.outbox}
+        self.assertEqual(subjects['to2@example.com'], 'My subject for user2')
+
+    @override_settings(TEMPLATED_EMAIL_RENDER_WORKERS=2,
+                       TEMPLATED_EMAIL_RENDER_POOL='fibers')
+    def test_send_mass_unknown_pool(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.backend.send_mass('mixed_template', 'from@example.com',
+                                   [('to@example.com', {})])
+
+    def test_send_mass_iter_consumes_recipients_in_chunks(self):
+        consumed = []
+
+        def recipients():
+            for i in range(5):
+                consumed.append(i)
+                yield 'to%d@example.com' % i, {'username': 'user%d' % i}
+
+        results = self.backend.send_mass_iter(
+            'mixed_template', 'from@example.com', recipients(), chunk_size=2)
+        first = next(results)
+        self.assertEqual(first.recipient_list, ['to0@example.com'])
+        self.assertEqual(len(consumed), 2)
+        self.assertEqual(len(list(results)), 4)
+        self.assertEqual(len(consumed), 5)
+        self.assertEqual(len(mail.outbox), 5)
+
+    @patch('templated_email.backends.vanilla_django.get_connection')
+    def test_send_queue(self, get_connection_mock):
+        message_id = self.backend.send('mixed_template', 'from@example.com',
+                                       ['to@example.com'], self.context,
+                                       queue=True)
+        self.assertEqual(len(mail.outbox), 0)
+        get_connection_mock.assert_not_called()
+        queued_email = QueuedEmail.objects.get()
+        self.assertEqual(queued_email.message_id, message_id)
+        self.assertEqual(queued_email.message.subject, SUBJECT_RESULT)
+        self.assertEqual(queued_email.message.body, PLAIN_RESULT)
+
+    @override_settings(TEMPLATED_EMAIL_QUEUE=True)
+    def test_send_queue_setting(self):
+        self.backend.send('mixed_template', 'from@example.com',
+                          ['to@example.com'], self.context,
+                          headers={'Message-Id': 'a_message_id'})
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(QueuedEmail.objects.get().message_id, 'a_message_id')
+
+        self.backend.send('mixed_template', 'from@example.com',
+                          ['to@example.com'], self.context, queue=False)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_send_queue_message_id_header_case(self):
+        message_id = self.backend.send('mixed_template', 'from@example.com',
+                                       ['to@example.com'], self.context,
+                                       headers={'Message-ID': '<a@example.com>'},
+                                       queue=True)
+        self.assertEqual(message_id, '<a@example.com>')
+        queued_email = QueuedEmail.objects.get()
+        self.assertEqual(queued_email.message_id, '<a@example.com>')
+        self.assertEqual(queued_email.message.message().get_all('Message-ID'),
+                         ['<a@example.com>'])
+
+    def test_send_queue_with_connection(self):
+        with self.assertRaises(ValueError):
+            self.backend.send('mixed_template', 'from@example.com',
+                              ['to@example.com'], self.context, queue=True,
+                              auth_user='user')
+        self.assertFalse(QueuedEmail.objects.exists())
+
+    @patch('templated_email.backends.vanilla_django.get_connection')
+    def test_send_mass_iter_closes_connection_once(self, get_connection_mock):
+        connection = get_connection_mock.return_value
+        connection.open.return_value = True
+        connection.send_messages.return_value = 1
+        results = list(self.backend.send_mass_iter(
+            'mixed_template', 'from@example.com',
+            (('to%d@example.com' % i, {}) for i in range(5)), chunk_size=2))
+        self.assertEqual(len(results), 5)
+        connection.open.assert_called_once()
+        connection.close.assert_called_once()
+
+    async def test_aget_email_message(self):
+        message = await self.backend.aget_email_message(
+            'mixed_template', self.context, to=['to@example.com'])
+        self.assertEqual(message.subject, SUBJECT_RESULT)
+        self.assertEqual(message.body, PLAIN_RESULT)
+
+    async def test_async_executor_closes_old_connections(self):
+        with patch('templated_email.backends.vanilla_django.close_old_connections') as close:
+            await self.backend.aget_email_message(
+                'mixed_template', self.context, to=['to@example.com'])
+        self.assertEqual(close.call_count, 2)
+
+    async def test_asend(self):
+        ret = await self.backend.asend('mixed_template', 'from@example.com',
+                                       ['to@example.com'], self.context,
+                                       headers={'Message-Id': 'a_message_id'})
+        self.assertEqual(ret, 'a_message_id')
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].subject, SUBJECT_RESULT)
+
+    @patch('templated_email.backends.vanilla_django.get_connection')
+    async def test_asend_mass(self, get_connection_mock):
+        connection = get_connection_mock.return_value
+        connection.open.return_value = True
+        connection.send_messages.return_value = 1
+        results = await self.backend.asend_mass(
+            'mixed_template', 'from@example.com',
+            [('to%d@example.com' % i, {'username': 'user%d' % i})
+             for i in range(5)] + [('broken@example.com', None)],
+            concurrency=2)
+        get_connection_mock.assert_called_once()
+        connection.open.assert_called_once()
+        connection.close.assert_called_once()
+        self.assertEqual(connection.send_messages.call_count, 5)
+        self.assertEqual([result.recipient_list for result in results][:2],
+                         [['to0@example.com'], ['to1@example.com']])
+        self.assertTrue(all(result.message_id for result in results[:5]))
+        self.assertIsNotNone(results[5].error)
+
+    @patch('templated_email.backends.vanilla_django.get_connection')
+    def test_send_mass_writes_saved_emails_in_bulk(self, get_connection_mock):
+        saved_before_send = []
+
+        def send_messages(messages):
+            saved_before_send.append(SavedEmail.objects.count())
+            return 1
+
+        get_connection_mock.return_value.send_messages.side_effect = send_messages
+        with patch.object(SavedEmail.objects, 'bulk_create',
+                          wraps=SavedEmail.objects.bulk_create) as bulk_create:
+            results = self.backend.send_mass(
+                'mixed_template', 'from@example.com',
+                [('to%d@example.com' % i, {}) for i in range(5)],
+                create_link=True, saved_email_batch_size=2)
+        self.assertEqual(bulk_create.call_count, 3)
+        self.assertEqual(SavedEmail.objects.count(), 5)
+        self.assertEqual(saved_before_send, [2, 2, 4, 4, 5])
+        self.assertTrue(all(result.message_id for result in results))
+
+    def test_get_email_message_collects_saved_emails(self):
+        saved_emails = []
+        self.backend.get_email_message('mixed_template', {}, create_link=True,
+                                       saved_emails=saved_emails)
+        self.assertEqual(len(saved_emails), 1)
+        self.assertIsNone(saved_emails[0].pk)
+        self.assertFalse(SavedEmail.objects.exists())
+
+    @patch('templated_email.backends.vanilla_django.get_connection')
+    def test_send_mass_uses_one_connection(self, get_connection_mock):
+        connection = get_connection_mock.return_value
+        connection.open.return_value = True
+        connection.send_messages.side_effect = [1, SMTPException('refused')]
+        results = self.backend.send_mass(
+            'mixed_template', 'from@example.com',
+            [('to@example.com', {}), ('to2@example.com', {})])
+        get_connection_mock.assert_called_once()
+        connection.open.assert_called_once()
+        connection.close.assert_called_once()
+        self.assertEqual(connection.send_messages.call_count, 2)
+        self.assertIsNotNone(results[0].message_id)
+        self.assertIsNone(results[1].message_id)
+        self.assertTrue(isinstance(results[1].error, SMTPException))
+
+    @patch('templated_email.backends.vanilla_django.get_connection')
+    def test_send_mass_reconnects_once(self, get_connection_mock):
+        connection = get_connection_mock.return_value
+        connection.open.return_value = True
+        connection.send_messages.side_effect = [
+            1, SMTPServerDisconnected(), 1, 1,
+            SMTPServerDisconnected(), SMTPServerDisconnected()]
+        results = self.backend.send_mass(
+            'mixed_template', 'from@example.com',
+            [('to%d@example.com' % i, {}) for i in range(4)])
+        self.assertEqual([result.error is None for result in results],
+                         [True, True, True, False])
+        self.assertTrue(isinstance(results[3].error, SMTPServerDisconnected))
+        self.assertEqual(connection.open.call_count, 3)
+        self.assertEqual(connection.close.call_count, 3)
+
+    def test_send_mass_reports_render_errors(self):
+        results = self.backend.send_mass(
+            'mixed_template', 'from@example.com',
+            [('to@example.com', {}), ('to2@example.com', None)])
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIsNone(results[0].error)
+        self.assertIsNone(results[1].message_id)
+        self.assertIsNotNone(results[1].error)
+
     @patch.object(
         template_backend_klass, 'get_email_message'
     )
@@ -410,6 +958,7 @@ class TemplateBackendTestCase(MockedNetworkTestCaseMixin,
             'auth_user': 'vintasoftware',
             'auth_password': 'password',
             'create_link': False,
+            'render_cache_key': 'a_key',
         }
 
         send_mock = get_email_message_mock.return_value.send
@@ -432,6 +981,7 @@ class TemplateBackendTestCase(MockedNetworkTestCaseMixin,
             template_dir=kwargs['template_dir'],
             file_extension=kwargs['file_extension'],
             create_link=kwargs['create_link'],
+            render_cache_key=kwargs['render_cache_key'],
             attachments=None,
         )
         send_mock.assert_called_with(
@@ -513,6 +1063,17 @@ class TemplateBackendTestCase(MockedNetworkTestCaseMixin,
             'templated_email/37b51d194a7513e45b56f6524f2d51f2foo.jpg')
         self.assertTrue(isinstance(content, BytesIO))
 
+    @patch('django.core.files.storage.FileSystemStorage.url')
+    @patch('django.core.files.storage.FileSystemStorage.save')
+    def test_host_file_backed_inline_image(self, mock_save, mock_url):
+        mock_url.return_value = 'media/saved_url'
+        path = Path(__file__).parent.parent / 'template_fixtures' / 'templated_email' / 'welcome.email'
+        inline_image = InlineImage.from_path(str(path), subtype='png')
+        saved = []
+        mock_save.side_effect = lambda name, content: saved.append(content.read())
+        self.backend.host_inline_image(inline_image)
+        self.assertEqual(saved, [path.read_bytes()])
+
     @patch('django.core.files.storage.FileSystemStorage.exists')
     @patch('django.core.files.storage.FileSystemStorage.save')
     def test_host_inline_image_if_exist(self, mock_save, mock_exists):
@@ -527,3 +1088,31 @@ class TemplateBackendTestCase(MockedNetworkTestCaseMixin,
         mock_save.assert_not_called()
         mock_exists.assert_called_once_with(
             'templated_email/37b51d194a7513e45b56f6524f2d51f2foo.jpg')
+
+    @patch('django.core.files.storage.FileSystemStorage.exists')
+    @patch('django.core.files.storage.FileSystemStorage.save')
+    def test_host_inline_image_is_memoized(self, mock_save, mock_exists):
+        mock_exists.return_value = True
+        inline_image = InlineImage('foo.jpg', b'bar')
+
+        with patch('templated_email.utils.hashlib.md5',
+                   wraps=hashlib.md5) as md5:
+            first = self.backend.host_inline_image(inline_image)
+            second = self.backend.host_inline_image(inline_image)
+            third = self.backend.host_inline_image(InlineImage('foo.jpg', b'bar'))
+        self.assertEqual(first, second)
+        self.assertEqual(first, third)
+        mock_exists.assert_called_once()
+        self.assertEqual(md5.call_count, 2)
+
+    @override_settings(TEMPLATED_EMAIL_INLINE_IMAGE_CACHE_ALIAS='default')
+    @patch('django.core.files.storage.FileSystemStorage.exists')
+    def test_host_inline_image_shared_cache(self, mock_exists):
+        caches['default'].clear()
+        mock_exists.return_value = True
+        inline_image = InlineImage('foo.jpg', b'bar')
+
+        url = self.backend.host_inline_image(inline_image)
+        _hosted_image_urls.clear()
+        self.assertEqual(self.backend.host_inline_image(inline_image), url)
+        mock_exists.assert_called_once()
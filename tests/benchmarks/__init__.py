@@ -0,0 +1,12 @@
+"""
+Benchmarks of the render and send hot paths of TemplateBackend.
+
+Run them from the repository root with::
+
+    python -m tests.benchmarks
+    python -m tests.benchmarks --save baseline.json
+    python -m tests.benchmarks --compare baseline.json
+
+They are not collected by the test suite, which only runs a quick smoke test
+of them.
+"""
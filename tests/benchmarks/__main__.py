@@ -0,0 +1,49 @@
+import argparse
+import os
+import sys
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m tests.benchmarks',
+        description="Benchmark the render and send hot paths of TemplateBackend.")
+    parser.add_argument('--iterations', type=int, default=50,
+                        help="How many times each benchmark runs.")
+    parser.add_argument('--recipients', type=int, default=10000,
+                        help="How many messages the send_mass benchmark sends.")
+    parser.add_argument('--only', action='append',
+                        help="Only run this benchmark, may be repeated.")
+    parser.add_argument('--save', metavar='PATH',
+                        help="Save the results as a baseline to this JSON file.")
+    parser.add_argument('--compare', metavar='PATH',
+                        help="Compare the results to the baseline in this JSON file.")
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help="Relative change reported as a regression by --compare.")
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tests.settings')
+    import django
+    django.setup()
+
+    from tests.benchmarks import suite
+
+    results = suite.run_isolated(iterations=args.iterations,
+                                 recipients=args.recipients, only=args.only)
+    print(suite.format_results(results))
+
+    if args.save:
+        suite.save(results, args.save)
+    if args.compare:
+        regressions = suite.compare(results, suite.load(args.compare),
+                                    args.threshold)
+        for name, metric, previous, value, change in regressions:
+            print('%s %s: %.2f -> %.2f (%+.0f%% worse)'
+                  % (name, metric, previous, value, change * 100))
+        if regressions:
+            return 1
+        print('No regression above %.0f%%.' % (args.threshold * 100))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,84 @@
+import random
+
+from templated_email import InlineImage
+
+
+TEMPLATE_DIR = 'templated_email/benchmarks/'
+
+# How many templates the deep template extends, one after the other.
+CHAIN_DEPTH = 8
+# How many rows the large template renders.
+LARGE_ROWS = 500
+# How many images, and of what size in bytes, the images template shows.
+IMAGE_COUNT = 30
+IMAGE_SIZE = 50 * 1024
+
+
+def get_templates():
+    """
+    Return the benchmark templates as a dict for the locmem template loader.
+    """
+    templates = {
+        TEMPLATE_DIR + 'base_0.email': (
+            '{% block subject %}Hi {{ username }}{% endblock %}'
+            '{% block html %}<html><body>{% block content %}'
+            '<p>Welcome {{ username }}</p>{% endblock %}</body></html>{% endblock %}'
+            '{% block plain %}Welcome {{ username }}{% endblock %}'),
+    }
+    for level in range(1, CHAIN_DEPTH):
+        templates[TEMPLATE_DIR + 'base_%d.email' % level] = (
+            '{%% extends "%sbase_%d.email" %%}'
+            '{%% block content %%}<section class="level-%d">{{ block.super }}'
+            '</section>{%% endblock %%}' % (TEMPLATE_DIR, level - 1, level))
+    templates[TEMPLATE_DIR + 'deep.email'] = (
+        '{%% extends "%sbase_%d.email" %%}'
+        '{%% block subject %%}Your order, {{ username }}{%% endblock %%}'
+        % (TEMPLATE_DIR, CHAIN_DEPTH - 1))
+    templates[TEMPLATE_DIR + 'large.email'] = (
+        '{%% extends "%sbase_0.email" %%}'
+        '{%% block content %%}<h1>Order of {{ username|title }}</h1><table>'
+        '{%% for item in items %%}<tr class="{%% cycle "odd" "even" %%}">'
+        '<td>{{ forloop.counter }}</td><td>{{ item.name|upper }}</td>'
+        '<td>{{ item.quantity }}</td><td>{{ item.price|floatformat:2 }}</td></tr>'
+        '{%% endfor %%}</table>{%% endblock %%}' % TEMPLATE_DIR)
+    templates[TEMPLATE_DIR + 'images.email'] = (
+        '{%% extends "%sbase_0.email" %%}{%% block content %%}%s{%% endblock %%}'
+        % (TEMPLATE_DIR, ''.join('<img src="{{ image_%d }}">' % index
+                                 for index in range(IMAGE_COUNT))))
+    return templates
+
+
+def get_templates_setting():
+    return [{
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'OPTIONS': {
+            'loaders': [
+                ('django.template.loaders.locmem.Loader', get_templates()),
+            ],
+        },
+    }]
+
+
+def get_context(index=0):
+    return {
+        'username': 'user %d' % index,
+        'items': [{'name': 'item %d' % row, 'quantity': row % 7 + 1,
+                   'price': row * 1.25} for row in range(LARGE_ROWS)],
+    }
+
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+def get_images():
+    # Random bytes behind a PNG signature, so the MIME subtype is guessed.
+    generator = random.Random(0)
+    return {'image_%d' % index: InlineImage(
+                'image_%d.png' % index,
+                PNG_SIGNATURE + generator.randbytes(IMAGE_SIZE - len(PNG_SIGNATURE)))
+            for index in range(IMAGE_COUNT)}
+
+
+def get_recipients(count):
+    return [(['to%d@example.com' % index], {'username': 'user %d' % index})
+            for index in range(count)]
@@ -0,0 +1,192 @@
+import json
+import statistics
+import time
+import tracemalloc
+
+from django.core import mail
+from django.core.mail import EmailMultiAlternatives
+from django.test.utils import override_settings
+
+from templated_email.backends.vanilla_django import (
+    TemplateBackend, _plain_cache, _template_cache)
+from tests.benchmarks import fixtures
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def measure(func, iterations):
+    """
+    Call ``func`` ``iterations`` times and return the duration of every call,
+    in seconds, along with the peak memory of one more call.
+
+    ``func`` may return a list of durations, e.g. one per message sent, which
+    are then used instead of the duration of the whole call.
+    """
+    durations = []
+    total = 0
+    count = 0
+    for _ in range(iterations):
+        start = time.perf_counter()
+        inner_durations = func()
+        elapsed = time.perf_counter() - start
+        total += elapsed
+        if inner_durations is None:
+            durations.append(elapsed)
+            count += 1
+        else:
+            durations.extend(inner_durations)
+            count += len(inner_durations)
+
+    # Tracing allocations slows everything down, keep it out of the timings.
+    tracemalloc.start()
+    try:
+        func()
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'count': count,
+        'per_second': count / total if total else 0.0,
+        'mean_ms': statistics.mean(durations) * 1000,
+        'p50_ms': percentile(durations, 0.50) * 1000,
+        'p95_ms': percentile(durations, 0.95) * 1000,
+        'p99_ms': percentile(durations, 0.99) * 1000,
+        'peak_memory_kb': peak_memory / 1024,
+    }
+
+
+def run(iterations=50, recipients=10000, only=None):
+    """
+    Run the benchmarks and return their results by name.
+
+    ``only`` limits the run to the benchmarks whose name is in it.
+    """
+    backend = TemplateBackend(template_prefix=fixtures.TEMPLATE_DIR)
+    context = fixtures.get_context()
+    images = fixtures.get_images()
+    recipients_with_contexts = fixtures.get_recipients(recipients)
+    html = backend._render_email('large', context)['html']
+
+    def render_deep():
+        backend._render_email('deep', {'username': 'user'})
+
+    def render_deep_cold():
+        _template_cache.clear()
+        backend._render_email('deep', {'username': 'user'})
+
+    def render_large():
+        backend._render_email('large', context)
+
+    def get_email_message():
+        backend.get_email_message('large', context, to=['to@example.com'])
+
+    def generate_plain_part():
+        # Measure the conversion itself, not the memoized result.
+        _plain_cache.clear()
+        backend._generate_plain_part({'html': html})
+
+    def attach_inline_images():
+        message = EmailMultiAlternatives()
+        for image in images.values():
+            image.attach_to_message(message)
+        message.message()
+
+    def get_email_message_with_images():
+        backend.get_email_message('images', dict(images, username='user'),
+                                  to=['to@example.com'])
+
+    def send_mass():
+        durations = []
+        last = time.perf_counter()
+        for result in backend.send_mass_iter(
+                'deep', 'from@example.com', recipients_with_contexts):
+            now = time.perf_counter()
+            durations.append(now - last)
+            last = now
+        mail.outbox = []
+        return durations
+
+    benchmarks = [
+        ('render_deep', render_deep, iterations),
+        ('render_deep_cold', render_deep_cold, iterations),
+        ('render_large', render_large, iterations),
+        ('get_email_message', get_email_message, iterations),
+        ('generate_plain_part', generate_plain_part, iterations),
+        ('attach_inline_images', attach_inline_images, iterations),
+        ('get_email_message_with_images', get_email_message_with_images, iterations),
+        ('send_mass', send_mass, 1),
+    ]
+    results = {}
+    for name, func, benchmark_iterations in benchmarks:
+        if only and name not in only:
+            continue
+        func()  # warm up
+        results[name] = measure(func, benchmark_iterations)
+    return results
+
+
+def run_isolated(**kwargs):
+    """
+    Run the benchmarks against the fixture templates and Django's locmem
+    email backend, whatever the settings in use.
+    """
+    with override_settings(
+            TEMPLATES=fixtures.get_templates_setting(),
+            EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+            TEMPLATED_EMAIL_RENDER_CACHE_ALIAS=None,
+            TEMPLATED_EMAIL_CONNECTION_POOL=False):
+        mail.outbox = []
+        try:
+            return run(**kwargs)
+        finally:
+            _template_cache.clear()
+            _plain_cache.clear()
+
+
+def compare(results, baseline, threshold=0.1):
+    """
+    Compare ``results`` to those of a previous run and return a list of
+    (name, metric, baseline value, value, relative change) tuples, one for
+    each metric at least ``threshold`` worse than in the baseline.
+    """
+    regressions = []
+    for name, metrics in results.items():
+        if name not in baseline:
+            continue
+        for metric, value in metrics.items():
+            previous = baseline[name].get(metric)
+            if metric == 'count' or not previous:
+                continue
+            change = (value - previous) / previous
+            if metric == 'per_second':
+                # Higher is better.
+                change = -change
+            if change > threshold:
+                regressions.append((name, metric, previous, value, change))
+    return regressions
+
+
+def format_results(results):
+    columns = ('count', 'per_second', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms',
+               'peak_memory_kb')
+    width = max(len(name) for name in results) if results else 0
+    lines = [' '.join([''.ljust(width)] + [column.rjust(14) for column in columns])]
+    for name, metrics in results.items():
+        lines.append(' '.join([name.ljust(width)] + [
+            (('%d' if column == 'count' else '%.2f') % metrics[column]).rjust(14)
+            for column in columns]))
+    return '\n'.join(lines)
+
+
+def load(path):
+    with open(path) as baseline_file:
+        return json.load(baseline_file)
+
+
+def save(results, path):
+    with open(path, 'w') as baseline_file:
+        json.dump(results, baseline_file, indent=2, sort_keys=True)
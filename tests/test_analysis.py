@@ -0,0 +1,88 @@
+from django.template import engines
+from django.test import TestCase
+
+from templated_email.analysis import get_template_variables
+
+PARTS = ('subject', 'html', 'plain')
+
+
+class GetTemplateVariablesTestCase(TestCase):
+
+    def get_variables(self, template_code, parts=PARTS):
+        template = engines['django'].from_string(template_code).template
+        return get_template_variables(template, parts)
+
+    def test_blocks(self):
+        self.assertEqual(self.get_variables(
+            '{% block subject %}Hi {{ name|default:nickname }}{% endblock %}'
+            '{% block html %}{% if admin and not banned %}{{ user.email }}'
+            '{% else %}{{ "literal" }}{% endif %}{% endblock %}'), {
+            'subject': {'name', 'nickname'},
+            'html': {'admin', 'banned', 'user'},
+        })
+
+    def test_scopes(self):
+        variables = self.get_variables(
+            '{% block html %}{% for item in items %}{{ item.name }}'
+            '{{ forloop.counter }}{{ currency }}{% empty %}{{ empty_text }}'
+            '{% endfor %}{% with total=order.total %}{{ total }}{% endwith %}'
+            '{% endblock %}')
+        self.assertEqual(variables['html'],
+                         {'items', 'currency', 'empty_text', 'order'})
+
+    def test_tags(self):
+        variables = self.get_variables(
+            '{% load i18n %}{% block plain %}{% url "view" pk as link %}'
+            '{% cycle odd even %}{% firstof a b %}{% trans title %}'
+            '{% blocktrans with name=user.name count counter=items|length %}'
+            '{{ name }} {{ extra }}{% plural %}{{ counter }}{% endblocktrans %}'
+            '{% filter upper|cut:separator %}{{ text }}{% endfilter %}'
+            '{% endblock %}')
+        self.assertEqual(variables['plain'], {
+            'pk', 'odd', 'even', 'a', 'b', 'title', 'user', 'items', 'extra',
+            'separator', 'text'})
+
+    def test_blocktranslate_context(self):
+        variables = self.get_variables(
+            '{% load i18n %}{% block subject %}'
+            '{% blocktranslate context ctx %}Hi{% endblocktranslate %}'
+            '{% endblock %}')
+        self.assertEqual(variables['subject'], {'ctx'})
+
+    def test_extends(self):
+        template = engines['django'].get_template(
+            'templated_email/inheritance_template.email').template
+        self.assertEqual(get_template_variables(template, PARTS), {
+            'subject': {'username'},
+            'html': {'username', 'full_name', 'joindate'},
+            'plain': {'username', 'joindate'},
+        })
+
+    def test_extends_variable(self):
+        self.assertEqual(self.get_variables(
+            '{% extends base %}{% block html %}{{ foo }}{% endblock %}'),
+            dict.fromkeys(PARTS))
+
+    def test_include(self):
+        variables = self.get_variables(
+            '{% block html %}'
+            '{% include "templated_email/html_template.email" with full_name=name %}'
+            '{% endblock %}'
+            '{% block plain %}'
+            '{% include "templated_email/html_template.email" with joindate=date only %}'
+            '{% endblock %}')
+        self.assertEqual(variables, {'html': {'username', 'joindate', 'name'},
+                                     'plain': {'date'}})
+
+    def test_include_variable(self):
+        self.assertEqual(self.get_variables(
+            '{% block html %}{% include template_name %}{% endblock %}'
+            '{% block plain %}{{ foo }}{% endblock %}'),
+            {'html': None, 'plain': {'foo'}})
+
+    def test_unknown_tags(self):
+        self.assertEqual(self.get_variables(
+            '{% block html %}{% debug %}{% endblock %}'
+            '{% block subject %}{% block inner %}{% debug %}{% endblock %}{% endblock %}'
+            '{% block plain %}{{ foo }}{% endblock %}'),
+            {'subject': None, 'html': None, 'plain': {'foo'}})
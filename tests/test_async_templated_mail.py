@@ -0,0 +1,57 @@
+from django.test import TestCase
+
+from unittest.mock import patch, AsyncMock, Mock
+
+from templated_email import (
+    aget_templated_mail, asend_templated_mail, asend_templated_mass_mail)
+
+
+class AsyncTemplatedMailTestCase(TestCase):
+    TEST_KWARGS = {
+        'cc': ['cc@example.com'],
+        'bcc': ['bcc@example.com'],
+        'fail_silently': True,
+        'headers': {'A_HEADER': 'foo'},
+        'template_prefix': 'prefix',
+        'template_suffix': 'suffix',
+        'something': 'else',
+        'create_link': False,
+    }
+
+    @patch('templated_email.TemplateBackend')
+    async def test_aget_templated_mail(self, mocked_backend):
+        aget_email_message = mocked_backend.return_value.aget_email_message = AsyncMock()
+        ret = await aget_templated_mail('a_template_name', {'context': 'content'},
+                                        to=['to@example.com'])
+        self.assertTrue(ret is aget_email_message.return_value)
+        aget_email_message.assert_called_with(
+            'a_template_name', {'context': 'content'}, from_email=None,
+            to=['to@example.com'], cc=None, bcc=None, headers=None,
+            template_prefix=None, template_suffix=None, create_link=False)
+
+    async def test_asend_templated_mail(self):
+        mocked_connection = Mock(asend=AsyncMock())
+        args = ['a_template_name', 'from@example.com', ['to@example.com'],
+                {'context': 'content'}]
+        ret = await asend_templated_mail(*args, connection=mocked_connection,
+                                         **self.TEST_KWARGS)
+        self.assertTrue(ret is mocked_connection.asend.return_value)
+        kwargs = dict(self.TEST_KWARGS)
+        del kwargs['template_prefix']
+        del kwargs['template_suffix']
+        mocked_connection.asend.assert_called_with(*args, **kwargs)
+
+    @patch('templated_email.get_connection')
+    async def test_asend_templated_mass_mail(self, mocked_get_connection):
+        mocked_connection = mocked_get_connection.return_value
+        mocked_connection.asend_mass = AsyncMock()
+        args = ['a_template_name', 'from@example.com',
+                [(['to@example.com'], {'context': 'content'})]]
+        ret = await asend_templated_mass_mail(*args, **self.TEST_KWARGS)
+        self.assertTrue(ret is mocked_connection.asend_mass.return_value)
+        mocked_get_connection.assert_called_with(template_prefix='prefix',
+                                                 template_suffix='suffix')
+        kwargs = dict(self.TEST_KWARGS)
+        del kwargs['template_prefix']
+        del kwargs['template_suffix']
+        mocked_connection.asend_mass.assert_called_with(*args, **kwargs)
@@ -0,0 +1,26 @@
+from django.core import mail
+from django.test import TestCase
+
+from tests.benchmarks import suite
+from tests.utils import MockedNetworkTestCaseMixin
+
+
+class BenchmarksTestCase(MockedNetworkTestCaseMixin, TestCase):
+
+    def test_run(self):
+        results = suite.run_isolated(iterations=2, recipients=3)
+        self.assertEqual(results['send_mass']['count'], 3)
+        self.assertEqual(results['render_deep']['count'], 2)
+        self.assertTrue(all(metrics['peak_memory_kb'] > 0
+                            for metrics in results.values()))
+        self.assertIn('render_large', suite.format_results(results))
+        self.assertEqual(mail.outbox, [])
+
+    def test_compare(self):
+        baseline = {'render': {'count': 10, 'p50_ms': 1.0, 'per_second': 100.0},
+                    'removed': {'p50_ms': 1.0}}
+        results = {'render': {'count': 20, 'p50_ms': 1.5, 'per_second': 95.0},
+                   'added': {'p50_ms': 1.0}}
+        self.assertEqual(suite.compare(results, baseline, threshold=0.1),
+                         [('render', 'p50_ms', 1.0, 1.5, 0.5)])
+        self.assertEqual(len(suite.compare(results, baseline, threshold=0.01)), 2)
@@ -0,0 +1,144 @@
+import uuid
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.apps import apps
+from django.core import mail
+from django.core.management import call_command, CommandError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from templated_email.backends.vanilla_django import TemplateBackend, _template_cache
+from templated_email.models import QueuedEmail, SavedEmail, SavedEmailContent
+from tests.utils import MockedNetworkTestCaseMixin
+
+
+class PruneSavedEmailsTestCase(TestCase):
+
+    def setUp(self):
+        for days in (1, 10, 40, 50, 60):
+            saved_email = SavedEmail.objects.create(uuid=uuid.uuid4(),
+                                                    html='foo %d' % (days // 20))
+            SavedEmail.objects.filter(pk=saved_email.pk).update(
+                created=timezone.now() - timedelta(days=days))
+            SavedEmailContent.objects.filter(pk=saved_email.body_id).update(
+                last_used=timezone.now() - timedelta(days=days))
+
+    def test_prune(self):
+        out = StringIO()
+        call_command('prune_saved_emails', days=30, batch_size=2, stdout=out)
+        self.assertEqual(SavedEmail.objects.count(), 2)
+        self.assertEqual(SavedEmailContent.objects.count(), 1)
+        self.assertIn('Deleted 3 saved emails and 2 bodies.', out.getvalue())
+
+    def test_prune_keeps_recently_used_bodies(self):
+        # The orphan body of 'foo 3' is reused by a send, but the email
+        # isn't written yet.
+        SavedEmail.objects.bulk_create([SavedEmail(html='foo 3')])
+        SavedEmail.objects.filter(body__content='foo 3').delete()
+        call_command('prune_saved_emails', days=30, stdout=StringIO())
+        self.assertEqual(list(SavedEmailContent.objects.values_list('content', flat=True)
+                              .order_by('content')), ['foo 0', 'foo 3'])
+
+    @override_settings(TEMPLATED_EMAIL_SAVED_EMAIL_MAX_AGE=5)
+    def test_prune_with_setting(self):
+        call_command('prune_saved_emails', stdout=StringIO())
+        self.assertEqual(SavedEmail.objects.count(), 1)
+
+    def test_prune_requires_an_age(self):
+        with self.assertRaises(CommandError):
+            call_command('prune_saved_emails', stdout=StringIO())
+
+
+class WarmEmailTemplatesTestCase(TestCase):
+
+    def setUp(self):
+        _template_cache.clear()
+
+    def test_warm_all(self):
+        out = StringIO()
+        err = StringIO()
+        with self.assertRaisesMessage(CommandError, "Couldn't warm 1 templates."):
+            call_command('warm_email_templates', stdout=out, stderr=err)
+        self.assertIn('mixed_template: ', out.getvalue())
+        self.assertIn('Warmed 9 templates in', out.getvalue())
+        self.assertIn('inexistent_base: TemplateDoesNotExist: foo', err.getvalue())
+
+        compiled = TemplateBackend()._get_compiled_template('inheritance_template')
+        self.assertEqual(compiled.parts, {'subject', 'html', 'plain'})
+
+    def test_warm_some(self):
+        out = StringIO()
+        call_command('warm_email_templates', 'welcome', stdout=out)
+        self.assertIn('Warmed 1 templates in', out.getvalue())
+        self.assertEqual(len(_template_cache), 1)
+
+
+class TemplatedEmailConfigTestCase(TestCase):
+
+    def setUp(self):
+        _template_cache.clear()
+
+    def test_ready_does_not_warm_by_default(self):
+        apps.get_app_config('templated_email').ready()
+        self.assertEqual(len(_template_cache), 0)
+
+    @override_settings(TEMPLATED_EMAIL_WARM_TEMPLATES=True)
+    def test_ready_warms_templates(self):
+        with self.assertLogs('templated_email.apps', 'WARNING') as logs:
+            apps.get_app_config('templated_email').ready()
+        self.assertEqual(len(_template_cache), 10)
+        self.assertIn('inexistent_base', logs.output[0])
+
+
+class SendQueuedEmailsTestCase(MockedNetworkTestCaseMixin, TestCase):
+
+    def setUp(self):
+        self.backend = TemplateBackend()
+        for i in range(3):
+            self.backend.send('mixed_template', 'from@example.com',
+                              ['to%d@example.com' % i], {'username': 'user%d' % i},
+                              queue=True)
+
+    def test_send(self):
+        self.assertEqual(len(mail.outbox), 0)
+        out = StringIO()
+        call_command('send_queued_emails', batch_size=2, stdout=out)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(QueuedEmail.objects.count(), 0)
+        self.assertIn('Sent 3 queued emails, 0 attempts failed.', out.getvalue())
+
+    def test_send_skips_emails_not_due(self):
+        QueuedEmail.objects.filter(message_id=QueuedEmail.objects.first().message_id).update(
+            next_attempt_at=timezone.now() + timedelta(minutes=1))
+        call_command('send_queued_emails', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(QueuedEmail.objects.count(), 1)
+
+    @patch('templated_email.connection_pool.ConnectionPool.send_messages',
+           side_effect=OSError('boom'))
+    def test_retry(self, send_messages):
+        out = StringIO()
+        call_command('send_queued_emails', retry_delay=60, stdout=out)
+        self.assertIn('Sent 0 queued emails, 3 attempts failed.', out.getvalue())
+        for queued_email in QueuedEmail.objects.all():
+            self.assertEqual(queued_email.status, QueuedEmail.QUEUED)
+            self.assertEqual(queued_email.attempts, 1)
+            self.assertEqual(queued_email.last_error, "OSError('boom')")
+            self.assertGreater(queued_email.next_attempt_at, timezone.now())
+
+    @patch('templated_email.connection_pool.ConnectionPool.send_messages',
+           side_effect=OSError('boom'))
+    def test_give_up(self, send_messages):
+        call_command('send_queued_emails', max_attempts=2, retry_delay=0,
+                     stdout=StringIO())
+        self.assertEqual(send_messages.call_count, 6)
+        self.assertEqual(
+            QueuedEmail.objects.filter(status=QueuedEmail.FAILED).count(), 3)
+
+    def test_send_over_a_pooled_connection(self):
+        with patch('templated_email.connection_pool.mail.get_connection',
+                   wraps=mail.get_connection) as get_connection:
+            call_command('send_queued_emails', stdout=StringIO())
+        get_connection.assert_called_once()
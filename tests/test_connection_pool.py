@@ -0,0 +1,145 @@
+import smtplib
+from unittest.mock import patch
+
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import TestCase, override_settings
+
+from templated_email import connection_pool
+from templated_email.backends.vanilla_django import TemplateBackend
+from templated_email.connection_pool import ConnectionPool, get_connection_pool
+from tests.utils import MockedNetworkTestCaseMixin
+
+
+class CountingBackend(EmailBackend):
+    opened = []
+    closed = []
+    failures = 0
+
+    def __init__(self, username=None, **kwargs):
+        super(CountingBackend, self).__init__(**kwargs)
+        self.username = username
+
+    def open(self):
+        self.opened.append(self)
+        return True
+
+    def close(self):
+        self.closed.append(self)
+
+    def send_messages(self, messages):
+        if CountingBackend.failures:
+            CountingBackend.failures -= 1
+            raise smtplib.SMTPServerDisconnected()
+        return super(CountingBackend, self).send_messages(messages)
+
+
+@override_settings(EMAIL_BACKEND='tests.test_connection_pool.CountingBackend')
+class ConnectionPoolTestCase(MockedNetworkTestCaseMixin, TestCase):
+    def setUp(self):
+        CountingBackend.opened = []
+        CountingBackend.closed = []
+        CountingBackend.failures = 0
+        self.message = mail.EmailMessage('subject', 'body', 'from@example.com',
+                                         ['to@example.com'])
+
+    def test_connection_reused(self):
+        pool = ConnectionPool()
+        pool.send_messages([self.message])
+        pool.send_messages([self.message])
+        self.assertEqual(len(CountingBackend.opened), 1)
+        self.assertEqual(CountingBackend.closed, [])
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_keyed_by_auth_user(self):
+        pool = ConnectionPool()
+        pool.send_messages([self.message], username='a')
+        pool.send_messages([self.message], username='b')
+        pool.send_messages([self.message], username='a')
+        self.assertEqual([c.username for c in CountingBackend.opened], ['a', 'b'])
+
+    def test_max_messages(self):
+        pool = ConnectionPool(max_messages=2)
+        for i in range(3):
+            pool.send_messages([self.message])
+        self.assertEqual(len(CountingBackend.opened), 2)
+        self.assertEqual(CountingBackend.closed, CountingBackend.opened[:1])
+
+    def test_idle_timeout(self):
+        pool = ConnectionPool(max_idle=30)
+        with patch('templated_email.connection_pool.time.monotonic',
+                   return_value=100):
+            pool.send_messages([self.message])
+        with patch('templated_email.connection_pool.time.monotonic',
+                   return_value=131):
+            pool.send_messages([self.message])
+        self.assertEqual(len(CountingBackend.opened), 2)
+        self.assertEqual(CountingBackend.closed, CountingBackend.opened[:1])
+
+    def test_max_size(self):
+        pool = ConnectionPool(max_size=1)
+        first = pool.acquire()
+        second = pool.acquire()
+        pool.release(first)
+        pool.release(second)
+        self.assertEqual(CountingBackend.closed, [second.connection])
+
+    def test_reconnect_on_failure(self):
+        pool = ConnectionPool()
+        pool.send_messages([self.message])
+        CountingBackend.failures = 1
+        sent = pool.send_messages([self.message])
+        self.assertEqual(sent, 1)
+        self.assertEqual(len(CountingBackend.opened), 2)
+        self.assertEqual(CountingBackend.closed, CountingBackend.opened[:1])
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_failure_discards_connection(self):
+        pool = ConnectionPool()
+        CountingBackend.failures = 2
+        with self.assertRaises(smtplib.SMTPServerDisconnected):
+            pool.send_messages([self.message])
+        self.assertEqual(CountingBackend.closed, CountingBackend.opened)
+        pool.send_messages([self.message])
+        self.assertEqual(len(CountingBackend.opened), 3)
+
+    def test_fail_silently_per_call(self):
+        pool = ConnectionPool()
+        CountingBackend.failures = 2
+        self.assertEqual(pool.send_messages([self.message], fail_silently=True), 0)
+        pool.send_messages([self.message], fail_silently=True)
+        CountingBackend.failures = 2
+        with self.assertRaises(smtplib.SMTPServerDisconnected):
+            pool.send_messages([self.message], fail_silently=False)
+
+    def test_close(self):
+        pool = ConnectionPool()
+        pool.send_messages([self.message])
+        pool.close()
+        self.assertEqual(CountingBackend.closed, CountingBackend.opened)
+
+    def test_disabled_by_default(self):
+        self.assertIsNone(get_connection_pool())
+
+    @override_settings(TEMPLATED_EMAIL_CONNECTION_POOL=True,
+                       TEMPLATED_EMAIL_CONNECTION_POOL_MAX_MESSAGES=5)
+    def test_setting(self):
+        pool = get_connection_pool()
+        self.assertIs(get_connection_pool(), pool)
+        self.assertEqual(pool.max_messages, 5)
+
+    def test_reset_on_setting_change(self):
+        with override_settings(TEMPLATED_EMAIL_CONNECTION_POOL=True):
+            pool = get_connection_pool()
+            pool.send_messages([self.message])
+        self.assertIsNone(connection_pool._pool)
+        self.assertEqual(CountingBackend.closed, CountingBackend.opened)
+
+    @override_settings(TEMPLATED_EMAIL_CONNECTION_POOL=True)
+    def test_template_backend_send(self):
+        backend = TemplateBackend()
+        for i in range(2):
+            backend.send('mixed_template', 'from@example.com',
+                         ['to@example.com'], {'username': 'vintasoftware'})
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(len(CountingBackend.opened), 1)
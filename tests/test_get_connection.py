@@ -1,5 +1,9 @@
-from django.test import TestCase
+from unittest.mock import patch
 
+from django.test import TestCase, override_settings
+from django.utils.module_loading import import_string
+
+import templated_email
 from templated_email import get_connection, backends
 
 
@@ -42,3 +46,37 @@ class GetConnectionTestCase(TestCase):
         klass = 'templated_email.backends.vanilla_django.NoBackend'
 
         self.assertRaises(ImportError, get_connection, klass)
+
+    def test_class_imported_once(self):
+        klass = 'templated_email.backends.vanilla_django'
+
+        with patch('templated_email.import_string',
+                   wraps=import_string) as mocked:
+            get_connection(klass)
+            get_connection(klass)
+
+        # the first lookup tries the omitted class name only
+        self.assertEqual(mocked.call_count, 1)
+
+    def test_class_cache_cleared_on_setting_change(self):
+        klass = 'templated_email.backends.vanilla_django'
+        get_connection(klass)
+
+        with override_settings(TEMPLATED_EMAIL_BACKEND=klass):
+            self.assertEqual(templated_email._backend_klasses, {})
+
+    def test_backend_instance_reused(self):
+        backend = backends.vanilla_django.TemplateBackend()
+
+        with override_settings(TEMPLATED_EMAIL_BACKEND=backend):
+            self.assertIs(get_connection(), backend)
+
+    def test_backend_instance_with_arguments(self):
+        backend = backends.vanilla_django.TemplateBackend()
+
+        connection = get_connection(backend, template_prefix='prefix/')
+
+        self.assertIsNot(connection, backend)
+        self.assertIsInstance(connection,
+                              backends.vanilla_django.TemplateBackend)
+        self.assertEqual(connection.template_prefix, 'prefix/')
@@ -0,0 +1,43 @@
+import hashlib
+import uuid
+import zlib
+
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+
+
+class MoveContentToBodyMigrationTestCase(TransactionTestCase):
+    migrate_from = [('templated_email', '0003_savedemailcontent')]
+    migrate_to = [('templated_email', '0004_savedemail_move_content_to_body')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_move_content_to_body(self):
+        apps = self.migrate(self.migrate_from)
+        SavedEmail = apps.get_model('templated_email', 'SavedEmail')
+        SavedEmail.objects.create(uuid=uuid.uuid4(), content='<p>foo</p>')
+        SavedEmail.objects.create(uuid=uuid.uuid4(), content='<p>foo</p>')
+        SavedEmail.objects.create(uuid=uuid.uuid4(), compression='zlib',
+                                  compressed_content=zlib.compress(b'<p>bar</p>'))
+
+        apps = self.migrate(self.migrate_to)
+        SavedEmail = apps.get_model('templated_email', 'SavedEmail')
+        SavedEmailContent = apps.get_model('templated_email', 'SavedEmailContent')
+        self.assertEqual(SavedEmailContent.objects.count(), 2)
+        self.assertFalse(SavedEmail.objects.filter(body__isnull=True).exists())
+        self.assertFalse(SavedEmail.objects.exclude(content='').exists())
+        bar = SavedEmailContent.objects.get(
+            digest=hashlib.sha256(b'<p>bar</p>').hexdigest())
+        self.assertEqual(bar.compression, 'zlib')
+
+        apps = self.migrate(self.migrate_from)
+        SavedEmail = apps.get_model('templated_email', 'SavedEmail')
+        self.assertEqual(SavedEmail.objects.filter(content='<p>foo</p>').count(), 2)
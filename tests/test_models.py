@@ -0,0 +1,121 @@
+import hashlib
+import uuid
+from datetime import timedelta
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.mail import EmailMessage
+from django.db import IntegrityError, connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+import pytest
+from unittest.mock import patch
+
+from templated_email.models import (
+    QueuedEmail, SavedEmail, SavedEmailContent, zstandard)
+
+
+class SavedEmailTestCase(TestCase):
+
+    def test_html_without_compression(self):
+        saved_email = SavedEmail.objects.create(uuid=uuid.uuid4(), html='<p>foo</p>')
+        saved_email.refresh_from_db()
+        self.assertEqual(saved_email.body.content, '<p>foo</p>')
+        self.assertEqual(saved_email.body.compression, '')
+        self.assertEqual(saved_email.html, '<p>foo</p>')
+
+    def test_deprecated_content(self):
+        with self.assertWarns(DeprecationWarning):
+            saved_email = SavedEmail.objects.create(uuid=uuid.uuid4(),
+                                                    content='<p>foo</p>')
+        saved_email.refresh_from_db()
+        self.assertEqual(saved_email.html, '<p>foo</p>')
+        with self.assertWarns(DeprecationWarning):
+            self.assertEqual(saved_email.content, '<p>foo</p>')
+
+    def test_identical_bodies_are_stored_once(self):
+        for _ in range(3):
+            SavedEmail.objects.create(html='<p>foo</p>')
+        SavedEmail.objects.bulk_create([SavedEmail(html='<p>foo</p>'),
+                                        SavedEmail(html='<p>bar</p>')])
+        self.assertEqual(SavedEmail.objects.count(), 5)
+        self.assertEqual(SavedEmailContent.objects.count(), 2)
+        body = SavedEmailContent.objects.get(
+            digest=hashlib.sha256(b'<p>foo</p>').hexdigest())
+        self.assertEqual(body.saved_emails.count(), 4)
+
+    def test_reused_body_marks_last_used(self):
+        SavedEmail.objects.create(html='<p>foo</p>')
+        SavedEmailContent.objects.update(last_used=timezone.now() - timedelta(days=1))
+        # Without upserts, as on MySQL or Oracle.
+        with patch.object(connection.features, 'supports_update_conflicts', False), \
+                patch.object(connection.features, 'supports_ignore_conflicts', False):
+            SavedEmail.objects.create(html='<p>foo</p>')
+        body = SavedEmailContent.objects.get()
+        self.assertGreater(body.last_used, timezone.now() - timedelta(hours=1))
+        self.assertEqual(body.saved_emails.count(), 2)
+
+    def test_body_written_meanwhile(self):
+        SavedEmail.objects.create(html='<p>foo</p>')
+        with patch.object(SavedEmailContent.objects, 'bulk_create',
+                          side_effect=IntegrityError):
+            SavedEmail.objects.bulk_create([SavedEmail(html='<p>foo</p>'),
+                                            SavedEmail(html='<p>bar</p>')])
+        self.assertEqual(SavedEmail.objects.count(), 3)
+        self.assertEqual(SavedEmailContent.objects.count(), 2)
+
+    @override_settings(TEMPLATED_EMAIL_SAVED_EMAIL_COMPRESSION='zlib')
+    def test_html_with_zlib_compression(self):
+        html = '<p>%s</p>' % ('foo ' * 1000)
+        saved_email = SavedEmail.objects.create(uuid=uuid.uuid4(), html=html)
+        saved_email = SavedEmail.objects.select_related('body').get(pk=saved_email.pk)
+        self.assertEqual(saved_email.body.content, '')
+        self.assertEqual(saved_email.body.compression, 'zlib')
+        self.assertLess(len(saved_email.body.compressed_content), len(html))
+        self.assertEqual(saved_email.html, html)
+
+    @pytest.mark.skipif(zstandard is None, reason='zstandard is not installed')
+    @override_settings(TEMPLATED_EMAIL_SAVED_EMAIL_COMPRESSION='zstd')
+    def test_html_with_zstd_compression(self):
+        saved_email = SavedEmail.objects.create(uuid=uuid.uuid4(), html='<p>foo</p>')
+        saved_email.refresh_from_db()
+        self.assertEqual(saved_email.body.compression, 'zstd')
+        self.assertEqual(saved_email.html, '<p>foo</p>')
+
+    @override_settings(TEMPLATED_EMAIL_SAVED_EMAIL_COMPRESSION='lzma')
+    def test_unknown_compression(self):
+        with self.assertRaises(ImproperlyConfigured):
+            SavedEmail(html='<p>foo</p>')
+
+
+class QueuedEmailTestCase(TestCase):
+
+    def test_message(self):
+        connection = object()
+        message = EmailMessage('subject', 'body', 'from@example.com',
+                               ['to@example.com'], connection=connection,
+                               headers={'Message-Id': '<id@example.com>'})
+        queued_email = QueuedEmail()
+        queued_email.message = message
+        queued_email.save()
+        self.assertIs(message.connection, connection)
+
+        queued_email.refresh_from_db()
+        self.assertEqual(queued_email.message_id, '<id@example.com>')
+        self.assertEqual(queued_email.message.subject, 'subject')
+        self.assertEqual(queued_email.message.to, ['to@example.com'])
+        self.assertIsNone(queued_email.message.connection)
+
+    def test_retry_later(self):
+        queued_email = QueuedEmail()
+        before = timezone.now()
+        queued_email.retry_later(ValueError('boom'), 3, 60)
+        queued_email.retry_later(ValueError('boom'), 3, 60)
+        self.assertEqual(queued_email.attempts, 2)
+        self.assertEqual(queued_email.status, QueuedEmail.QUEUED)
+        self.assertEqual(queued_email.last_error, "ValueError('boom')")
+        self.assertGreaterEqual(queued_email.next_attempt_at,
+                                before + timedelta(seconds=120))
+
+        queued_email.retry_later(ValueError('boom'), 3, 60)
+        self.assertEqual(queued_email.status, QueuedEmail.FAILED)
@@ -0,0 +1,55 @@
+from django.test import TestCase
+
+from templated_email.backends.vanilla_django import TemplateBackend
+from templated_email.signals import email_stage_timed, stage_started
+from tests.utils import MockedNetworkTestCaseMixin
+
+
+class EmailStageTimedTestCase(MockedNetworkTestCaseMixin, TestCase):
+
+    def setUp(self):
+        self.backend = TemplateBackend()
+        self.stages = []
+
+    def receiver(self, sender, stage, template_name, duration, **kwargs):
+        self.stages.append((stage, template_name, kwargs.get('part')))
+        self.assertGreaterEqual(duration, 0)
+
+    def test_send_stages(self):
+        email_stage_timed.connect(self.receiver)
+        self.addCleanup(email_stage_timed.disconnect, self.receiver)
+
+        self.backend.send('html_template', 'from@example.com', ['to@example.com'],
+                          {'username': 'vintasoftware'}, create_link=True)
+
+        self.assertEqual(self.stages, [
+            ('resolve', 'html_template', None),
+            ('render', 'html_template', 'subject'),
+            ('render', 'html_template', 'html'),
+            ('render', 'html_template', 'html'),
+            ('save_email', 'html_template', None),
+            ('plain', 'html_template', None),
+            ('attach_images', 'html_template', None),
+            ('send', 'html_template', None),
+        ])
+
+    def test_send_mass_stages(self):
+        email_stage_timed.connect(self.receiver, sender=TemplateBackend)
+        self.addCleanup(email_stage_timed.disconnect, self.receiver,
+                        sender=TemplateBackend)
+
+        self.backend.send_mass('mixed_template', 'from@example.com',
+                               [('to%d@example.com' % i, {}) for i in range(2)],
+                               create_link=True)
+
+        stages = [stage for stage, template_name, part in self.stages]
+        self.assertEqual(stages.count('save_email'), 1)
+        self.assertEqual(stages.count('send'), 2)
+
+    def test_untimed_without_receivers(self):
+        self.assertIsNone(stage_started(TemplateBackend))
+        email_stage_timed.connect(self.receiver, sender=object)
+        self.addCleanup(email_stage_timed.disconnect, self.receiver,
+                        sender=object)
+        self.assertIsNone(stage_started(TemplateBackend))
+        self.assertIsNotNone(stage_started(object))
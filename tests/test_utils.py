@@ -1,10 +1,33 @@
+import base64
+import hashlib
+import os
+import pickle
+import shutil
+import tempfile
+import weakref
+from email.mime.image import MIMEImage
 from unittest.mock import patch, Mock
 
-from django.test import TestCase
+from anymail.message import AnymailMessage
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.mail import EmailMessage, EmailMultiAlternatives
+from django.template import Context, engines
+from django.test import TestCase, override_settings
+from django.utils.functional import SimpleLazyObject
+from django.utils.module_loading import import_string
 
 from templated_email import InlineImage
+from templated_email.utils import (LazyValue, LRUCache, get_emailmessage_klass,
+                                   get_evaluated_value, html_to_text,
+                                   lazy_context)
 from tests.utils import MockedNetworkTestCaseMixin
 
+PNG = base64.b64decode(
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABAQMAAAAl21bKAAAAA1BMVEUAAACnej3aAAAAAXRSTlMAQO'
+    'bYZgAAAApJREFUCNdjYAAAAAIAAeIhvDMAAAAASUVORK5CYII=')
+
 
 class InlineMessageTestCase(MockedNetworkTestCaseMixin, TestCase):
     def setUp(self):
@@ -52,3 +75,206 @@ class InlineMessageTestCase(MockedNetworkTestCaseMixin, TestCase):
                          self.inline_image._content_id)
         self.assertEqual(mimeimage.get('Content-Disposition'),
                          'inline; filename="foo.png"')
+
+
+    def test_md5_is_cached(self):
+        inline_image = InlineImage('foo.png', b'content', 'png')
+        self.assertEqual(inline_image.md5, '9a0364b9e99bb480dd25e1f0284c8555')
+        with patch('templated_email.utils.hashlib.md5') as md5:
+            inline_image.md5
+        md5.assert_not_called()
+        inline_image.content = b'content2'
+        self.assertNotEqual(inline_image.md5, '9a0364b9e99bb480dd25e1f0284c8555')
+
+    def test_attach_to_message_reuses_encoded_payload(self):
+        inline_image = InlineImage('foo.png', b'content', 'png')
+        first, second = Mock(), Mock()
+        inline_image.attach_to_message(first)
+        inline_image.attach_to_message(second)
+        first_image = first.attach.call_args[0][0]
+        second_image = second.attach.call_args[0][0]
+        self.assertIsNot(first_image, second_image)
+        self.assertIs(first_image.get_payload(), second_image.get_payload())
+        self.assertEqual(second_image.get_payload(decode=True), b'content')
+        self.assertEqual(second_image.get_content_type(), 'image/png')
+        self.assertEqual(second_image['Content-Transfer-Encoding'], 'base64')
+
+    def test_changing_content_or_subtype_drops_payload(self):
+        inline_image = InlineImage('foo.png', b'content', 'png')
+        inline_image.get_mime_payload()
+        inline_image.content = b'content2'
+        self.assertEqual(inline_image.get_mime_payload(),
+                         ('png', MIMEImage(b'content2', 'png').get_payload()))
+        inline_image.subtype = 'gif'
+        self.assertEqual(inline_image.get_mime_payload()[0], 'gif')
+
+
+class FileBackedInlineImageTestCase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'foo.png')
+        with open(self.path, 'wb') as image_file:
+            image_file.write(PNG)
+        self.expected = InlineImage('foo.png', PNG).get_mime_payload()
+
+    def test_from_path(self):
+        inline_image = InlineImage.from_path(self.path)
+        self.assertEqual(inline_image.filename, 'foo.png')
+        self.assertIsNone(inline_image._content)
+        self.assertEqual(inline_image.get_mime_payload(), self.expected)
+        self.assertEqual(inline_image.md5, hashlib.md5(PNG).hexdigest())
+        self.assertEqual(inline_image.content, PNG)
+
+    def test_from_path_empty_file(self):
+        open(self.path, 'wb').close()
+        inline_image = InlineImage.from_path(self.path, subtype='png')
+        self.assertEqual(inline_image.get_mime_payload(), ('png', ''))
+
+    def test_from_file(self):
+        inline_image = InlineImage.from_file(File(None, name=self.path))
+        self.assertEqual(inline_image.filename, 'foo.png')
+        self.assertEqual(inline_image.get_mime_payload(), self.expected)
+
+    def test_from_in_memory_file(self):
+        inline_image = InlineImage.from_file(ContentFile(PNG, name='bar.png'))
+        self.assertEqual(inline_image.filename, 'bar.png')
+        self.assertEqual(inline_image.get_mime_payload(), self.expected)
+
+    def test_from_storage(self):
+        storage = FileSystemStorage(location=self.directory)
+        inline_image = InlineImage.from_storage('foo.png', storage,
+                                                filename='bar.png')
+        self.assertEqual(inline_image.filename, 'bar.png')
+        self.assertEqual(inline_image.get_mime_payload(), self.expected)
+
+    def test_attach_to_message(self):
+        inline_image = InlineImage.from_path(self.path)
+        message = EmailMultiAlternatives()
+        inline_image.attach_to_message(message)
+        self.assertEqual(message.attachments[0].get_payload(decode=True), PNG)
+        self.assertEqual(message.attachments[0].get_content_type(), 'image/png')
+
+    def test_setting_content_drops_file(self):
+        inline_image = InlineImage.from_path(self.path)
+        inline_image.content = b'content'
+        self.assertEqual(inline_image.md5, hashlib.md5(b'content').hexdigest())
+
+    def test_pickle(self):
+        inline_image = pickle.loads(pickle.dumps(InlineImage.from_path(self.path)))
+        self.assertEqual(inline_image.content, PNG)
+
+    def test_slots(self):
+        inline_image = InlineImage.from_path(self.path)
+        self.assertFalse(hasattr(inline_image, '__dict__'))
+        self.assertIs(weakref.ref(inline_image)(), inline_image)
+
+
+class LRUCacheTestCase(TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_callable_maxsize(self):
+        cache = LRUCache(lambda: 0)
+        cache.set('a', 1)
+        self.assertEqual(len(cache), 0)
+
+
+class HtmlToTextTestCase(TestCase):
+    def test_blocks_and_lists(self):
+        html = ('<html><head><title>Ignored</title></head><body>'
+                '<p>Hi   Foo\n Bar,</p><ul><li>one</li><li>two</li></ul>'
+                '<dl><dt>username</dt><dd>vintasoftware</dd></dl></body></html>')
+        self.assertEqual(html_to_text(html),
+                         'Hi Foo Bar,\n\n* one\n* two\n\nusername\n    vintasoftware\n')
+
+    def test_links_and_images(self):
+        html = ('<p><a href="http://example.com">Site</a> '
+                '<a href="http://example.com">http://example.com</a> '
+                '<img src="cid:foo" alt="logo"> &amp; more</p>')
+        self.assertEqual(html_to_text(html),
+                         'Site (http://example.com) http://example.com logo & more\n')
+
+    def test_tables(self):
+        html = ('<table><tr><th>Item</th><th>Price</th></tr>\n'
+                '  <tr>\n    <td>c1</td>\n    <td> c2</td>\n  </tr>'
+                '<tr><td>c3</td><td>c4</td></tr></table>')
+        self.assertEqual(html_to_text(html), 'Item\tPrice\nc1\tc2\nc3\tc4\n')
+
+
+class KlassFromConfigTestCase(TestCase):
+    @override_settings(
+        TEMPLATED_EMAIL_EMAIL_MESSAGE_CLASS='django.core.mail.EmailMessage')
+    def test_class_imported_once(self):
+        with patch('templated_email.utils.import_string',
+                   wraps=import_string) as mocked:
+            self.assertIs(get_emailmessage_klass(), EmailMessage)
+            self.assertIs(get_emailmessage_klass(), EmailMessage)
+
+        self.assertEqual(mocked.call_count, 1)
+
+    def test_setting_change_clears_cache(self):
+        with override_settings(
+                TEMPLATED_EMAIL_EMAIL_MESSAGE_CLASS='django.core.mail.EmailMessage'):
+            get_emailmessage_klass()
+        with override_settings(
+                TEMPLATED_EMAIL_EMAIL_MESSAGE_CLASS='anymail.message.AnymailMessage'):
+            self.assertIs(get_emailmessage_klass(), AnymailMessage)
+
+
+class LazyContextTestCase(TestCase):
+
+    def test_lazy_value_called_once(self):
+        func = Mock(return_value='foo')
+        lazy_value = LazyValue(func)
+        self.assertFalse(lazy_value.evaluated)
+        self.assertEqual(lazy_value(), 'foo')
+        self.assertEqual(lazy_value(), 'foo')
+        self.assertTrue(lazy_value.evaluated)
+        func.assert_called_once_with()
+
+    def test_lazy_context(self):
+        def delete():
+            pass
+        delete.alters_data = True
+
+        def func():
+            pass
+
+        context = {'func': func, 'delete': delete, 'klass': dict, 'value': 1}
+        overlay = lazy_context(context)
+        self.assertIsInstance(overlay['func'], LazyValue)
+        self.assertIs(overlay['delete'], delete)
+        self.assertIs(overlay['klass'], dict)
+        self.assertEqual(overlay['value'], 1)
+        self.assertIs(context['func'], func)
+
+    def test_lazy_context_skips_callables_needing_arguments(self):
+        def func(value):
+            pass
+
+        overlay = lazy_context({'func': func})
+        self.assertIs(overlay['func'], func)
+        template = engines['django'].from_string('[{{ func }}]').template
+        self.assertEqual(template.render(Context(overlay)), '[]')
+
+    def test_get_evaluated_value(self):
+        func = Mock(return_value='foo')
+        lazy_object = SimpleLazyObject(func)
+        self.assertIsNone(get_evaluated_value(lazy_object))
+        func.assert_not_called()
+        str(lazy_object)
+        self.assertEqual(get_evaluated_value(lazy_object), 'foo')
+
+        lazy_value = LazyValue(func)
+        self.assertIsNone(get_evaluated_value(lazy_value))
+        lazy_value()
+        self.assertEqual(get_evaluated_value(lazy_value), 'foo')
+        self.assertEqual(get_evaluated_value('bar'), 'bar')
@@ -1,7 +1,7 @@
 import uuid
 
 from django.urls import reverse
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.test import Client
 
 from templated_email.models import SavedEmail
@@ -20,6 +20,12 @@ class ShowEmailViewTestCase(TestCase):
         response = self.client.get(self.url)
         self.assertEqual(response.status_code, 200)
 
+    @override_settings(TEMPLATED_EMAIL_SAVED_EMAIL_COMPRESSION='zlib')
+    def test_get_compressed(self):
+        saved_email = SavedEmail.objects.create(html='<p>bar</p>')
+        response = self.client.get('/email/%s/' % saved_email.uuid)
+        self.assertContains(response, '<p>bar</p>')
+
     def test_get_hex(self):
         response = self.client.get(self.url_hex)
         self.assertEqual(response.status_code, 200)